@@ -0,0 +1,3 @@
+"""
+Shared building blocks for the Python MCP provider servers
+"""
@@ -0,0 +1,196 @@
+"""
+Per-model circuit breakers
+
+A breaker opens when, over a rolling window, the upstream error rate or
+the share of calls slower than a latency threshold crosses its limit.
+While open, calls fail fast with CircuitOpenError. After a cool-down a
+few half-open probes are let through; a successful probe closes the
+circuit and a failed one re-opens it.
+"""
+
+import os
+import time
+from collections import OrderedDict, deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, key, retry_after):
+        super().__init__(f"Circuit open for {key}; retry in {retry_after:.0f}s")
+        self.key = key
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Rolling-window breaker for one (provider, model)"""
+
+    def __init__(self, key, window_seconds=60, min_requests=10, error_rate=0.5, slow_ms=0,
+                 slow_rate=0.5, open_seconds=30, half_open_probes=1):
+        self.key = key
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_ms = slow_ms
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.calls = deque()
+        self.stats = {
+            'opened': 0,
+            'rejected': 0
+        }
+
+    def check(self):
+        """Fail fast while open; moves to half-open once the cool-down passes"""
+        if self.state == OPEN:
+            remaining = self.opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self.stats['rejected'] += 1
+                raise CircuitOpenError(self.key, remaining)
+            self.state = HALF_OPEN
+            self.probes = 0
+
+    def acquire(self):
+        """Admit a call, counting it as a probe while half-open"""
+        self.check()
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_probes:
+                self.stats['rejected'] += 1
+                raise CircuitOpenError(self.key, 1)
+            self.probes += 1
+
+    def record(self, failed, latency_ms=None):
+        """Feed a finished call's outcome into the window; None means it said nothing about health"""
+        if failed is None:
+            if self.state == HALF_OPEN:
+                self.probes -= 1
+            return
+
+        slow = bool(self.slow_ms and latency_ms is not None and latency_ms > self.slow_ms)
+        if self.state == HALF_OPEN:
+            if failed or slow:
+                self._open()
+            else:
+                self.state = CLOSED
+                self.calls.clear()
+            return
+
+        now = time.monotonic()
+        self.calls.append((now, failed, slow))
+        while self.calls and self.calls[0][0] < now - self.window_seconds:
+            self.calls.popleft()
+
+        if self.state == CLOSED and len(self.calls) >= self.min_requests:
+            failures = sum(1 for _, f, _ in self.calls if f)
+            slows = sum(1 for _, _, s in self.calls if s)
+            if failures / len(self.calls) >= self.error_rate or (self.slow_ms and slows / len(self.calls) >= self.slow_rate):
+                self._open()
+
+    def snapshot(self):
+        """State and window counts for /health"""
+        total = len(self.calls)
+        failures = sum(1 for _, f, _ in self.calls if f)
+        snapshot = {
+            'state': self.state,
+            'windowCalls': total,
+            'errorRate': failures / total if total else 0.0,
+            **self.stats
+        }
+        if self.state == OPEN:
+            snapshot['retryAfter'] = max(0.0, round(self.opened_at + self.open_seconds - time.monotonic(), 1))
+        return snapshot
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.stats['opened'] += 1
+        self.calls.clear()
+
+class BreakerRegistry:
+    """Creates a CircuitBreaker per model on first use
+
+    Clients name the model, so at most max_models breakers are kept; the
+    least recently used closed ones go first.
+    """
+
+    def __init__(self, provider, enabled=True, max_models=256, **settings):
+        self.provider = provider
+        self.enabled = enabled
+        self.max_models = max_models
+        self.settings = settings
+        self.breakers = OrderedDict()
+
+    @classmethod
+    def from_env(cls, provider, prefix):
+        """Build a registry from <PREFIX>_BREAKER_* environment variables"""
+        return cls(
+            provider,
+            enabled=os.getenv(f'{prefix}_BREAKER_ENABLED', 'true').lower() == 'true',
+            window_seconds=float(os.getenv(f'{prefix}_BREAKER_WINDOW', 60)),
+            min_requests=int(os.getenv(f'{prefix}_BREAKER_MIN_REQUESTS', 10)),
+            error_rate=float(os.getenv(f'{prefix}_BREAKER_ERROR_RATE', 0.5)),
+            slow_ms=float(os.getenv(f'{prefix}_BREAKER_SLOW_MS', 0)),
+            slow_rate=float(os.getenv(f'{prefix}_BREAKER_SLOW_RATE', 0.5)),
+            open_seconds=float(os.getenv(f'{prefix}_BREAKER_OPEN_SECONDS', 30)),
+            half_open_probes=int(os.getenv(f'{prefix}_BREAKER_HALF_OPEN_PROBES', 1)),
+            max_models=int(os.getenv(f'{prefix}_BREAKER_MAX_MODELS', 256))
+        )
+
+    def for_model(self, model):
+        """Return the model's breaker, creating it on first use"""
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker(f'{self.provider}:{model}', **self.settings)
+            self._evict()
+        self.breakers.move_to_end(model)
+        return self.breakers[model]
+
+    def _evict(self):
+        """Drop least recently used closed breakers over max_models; open circuits keep failing fast"""
+        excess = len(self.breakers) - self.max_models
+        for model in [model for model, breaker in self.breakers.items() if breaker.state == CLOSED]:
+            if excess <= 0:
+                break
+            del self.breakers[model]
+            excess -= 1
+
+    def check(self, model):
+        """Fail fast before queueing if the model's circuit is open"""
+        if self.enabled:
+            self.for_model(model).check()
+
+    async def call(self, model, fn, is_failure):
+        """Run fn() through the model's breaker
+
+        is_failure(e) returns True for upstream faults, False for errors
+        that don't reflect upstream health (e.g. 429s or bad requests).
+        """
+        if not self.enabled:
+            return await fn()
+
+        breaker = self.for_model(model)
+        breaker.acquire()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except Exception as e:
+            breaker.record(True if is_failure(e) else None)
+            raise
+        except BaseException:
+            breaker.record(None)
+            raise
+        breaker.record(False, (time.monotonic() - started) * 1000)
+        return result
+
+    def is_open(self):
+        """True if any model's circuit is currently rejecting calls"""
+        return any(breaker.state == OPEN for breaker in self.breakers.values())
+
+    def snapshot(self):
+        """Per-model breaker state"""
+        return {model: breaker.snapshot() for model, breaker in self.breakers.items()}
@@ -0,0 +1,188 @@
+"""
+Exact-match response cache for provider completions
+
+Two tiers: an in-process LRU in front of a SQLite file that survives
+restarts. Entries expire after a TTL and the disk tier is trimmed
+least-recently-used first once it grows past its byte budget.
+
+The memory tier and the counters are only touched on the event loop;
+SQLite work runs in a worker thread so a lookup never blocks the loop on
+disk I/O.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+def cache_key(provider, prompt, model, temperature, max_tokens):
+    """Hash the provider and normalized request parameters into a cache key
+
+    The gateway's providers share one cache, so the provider is part of the
+    key: the same model name at two providers is two different upstreams.
+    """
+    normalized = {
+        'provider': provider,
+        'prompt': prompt.replace('\r\n', '\n').strip(),
+        'model': model,
+        'temperature': round(float(temperature), 3),
+        'max_tokens': int(max_tokens)
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+class ResponseCache:
+    """LRU memory tier backed by a persistent SQLite store"""
+
+    def __init__(self, path, ttl=86400, memory_entries=1024, disk_max_bytes=64 * 1024 * 1024, enabled=True):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.enabled = enabled
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {
+            'memoryHits': 0,
+            'diskHits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'tokensSaved': 0,
+            'latencySavedMs': 0.0
+        }
+        self.db = None
+        self.disk_bytes = 0
+        if enabled:
+            self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                'created REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+            self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+            self.disk_bytes = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @classmethod
+    def from_env(cls, prefix, default_path):
+        """Build a cache from <PREFIX>_CACHE_* environment variables"""
+        return cls(
+            path=os.getenv(f'{prefix}_CACHE_PATH', default_path),
+            ttl=float(os.getenv(f'{prefix}_CACHE_TTL', 86400)),
+            memory_entries=int(os.getenv(f'{prefix}_CACHE_MEMORY_ENTRIES', 1024)),
+            disk_max_bytes=int(float(os.getenv(f'{prefix}_CACHE_DISK_MAX_MB', 64)) * 1024 * 1024),
+            enabled=os.getenv(f'{prefix}_CACHE_ENABLED', 'true').lower() == 'true'
+        )
+
+    async def get(self, key):
+        """Return the cached entry for key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry and now - entry['created'] <= self.ttl:
+            self.entries.move_to_end(key)
+            self._count_hit('memoryHits', entry)
+            return entry
+        if entry:
+            del self.entries[key]
+
+        entry = await asyncio.to_thread(self._disk_get, key, now)
+        if entry:
+            self._remember(key, entry)
+            self._count_hit('diskHits', entry)
+            return entry
+
+        self.stats['misses'] += 1
+        return None
+
+    async def put(self, key, reply, usage, latency_ms):
+        """Store a fresh upstream reply with the cost it took to produce"""
+        if not self.enabled:
+            return
+
+        now = time.time()
+        entry = {'reply': reply, 'usage': usage, 'latencyMs': latency_ms, 'created': now}
+        self._remember(key, entry)
+        self.stats['stores'] += 1
+        evicted = await asyncio.to_thread(self._disk_put, key, json.dumps(entry), now)
+        for evicted_key in evicted:
+            self.entries.pop(evicted_key, None)
+        self.stats['evictions'] += len(evicted)
+
+    def snapshot(self):
+        """Counters and sizes for the stats endpoint"""
+        hits = self.stats['memoryHits'] + self.stats['diskHits']
+        lookups = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'enabled': self.enabled,
+            'hitRatio': hits / lookups if lookups else 0.0,
+            'memoryEntries': len(self.entries),
+            'diskBytes': self.disk_bytes
+        }
+
+    def _count_hit(self, tier, entry):
+        self.stats[tier] += 1
+        self.stats['tokensSaved'] += entry['usage'].get('totalTokens', entry['usage'].get('total_tokens', 0))
+        self.stats['latencySavedMs'] += entry['latencyMs']
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        # Entries pushed out of memory stay on disk, so only disk trims count as evictions
+        while len(self.entries) > self.memory_entries:
+            self.entries.popitem(last=False)
+
+    def _disk_get(self, key, now):
+        """Worker thread: read a fresh row and mark it used, dropping it if expired"""
+        with self.lock:
+            row = self.db.execute('SELECT value, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self.db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+                return json.loads(row[0])
+            if row:
+                self._delete(key)
+            return None
+
+    def _disk_put(self, key, value, now):
+        """Worker thread: write a row and trim to budget; returns the keys evicted"""
+        with self.lock:
+            self._delete(key)
+            self.db.execute(
+                'INSERT INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)',
+                (key, value, len(value), now, now)
+            )
+            self.disk_bytes += len(value)
+            if self.disk_bytes > self.disk_max_bytes:
+                return self._trim_disk()
+            return []
+
+    def _delete(self, key):
+        row = self.db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+        if row:
+            self.db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self.disk_bytes -= row[0]
+
+    def _trim_disk(self):
+        # Drop expired rows first, then the least recently used until under budget
+        expired = time.time() - self.ttl
+        self.disk_bytes -= self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses WHERE created < ?', (expired,)
+        ).fetchone()[0]
+        self.db.execute('DELETE FROM responses WHERE created < ?', (expired,))
+
+        evicted = []
+        rows = self.db.execute('SELECT key, size FROM responses ORDER BY accessed').fetchall()
+        for key, size in rows:
+            if self.disk_bytes <= self.disk_max_bytes:
+                break
+            self.db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self.disk_bytes -= size
+            evicted.append(key)
+        return evicted
@@ -0,0 +1,111 @@
+"""
+Multi-provider gateway
+
+One Quart app hosts any number of providers. They share a connection
+pool manager, response cache, single-flight table, scheduler, metrics
+and tracer; each provider keeps its own routes under /mcp/<name>/,
+circuit breakers and memory file. The per-provider servers are this app
+with a single provider.
+"""
+
+import importlib
+import os
+from datetime import datetime
+
+from quart import Quart, jsonify
+
+from common.cache import ResponseCache
+from common.metrics import ServerMetrics
+from common.pools import PoolManager
+from common.scheduler import Scheduler
+from common.singleflight import SingleFlight
+from common.tracing import Tracer
+
+# Built-in providers; plugins can also be named by 'module:Class'
+PROVIDERS = {
+    'gpt4': 'common.providers.gpt4:GPT4Provider',
+    'deepseek': 'common.providers.deepseek:DeepSeekProvider'
+}
+
+def load_provider(name):
+    """Import a provider class by built-in name or 'module:Class' path"""
+    module, _, attr = PROVIDERS.get(name, name).partition(':')
+    return getattr(importlib.import_module(module), attr)
+
+class Gateway:
+    """Resources shared by every hosted provider"""
+
+    def __init__(self, providers, prefix, service, base_dir):
+        self.service = service
+        self.cache = ResponseCache.from_env(prefix, os.path.join(base_dir, 'cache.db'))
+        self.flights = SingleFlight()
+        self.scheduler = Scheduler.from_env(prefix)
+        self.pools = PoolManager()
+        self.metrics = ServerMetrics(service)
+        self.tracer = Tracer.from_env(prefix, service, os.path.join(base_dir, 'traces.jsonl'))
+        self.providers = {provider.name: provider for provider in providers}
+        for provider in providers:
+            provider.attach(self)
+
+    def cache_lookups(self):
+        """(hits, misses) per cache layer for the /metrics hit ratios"""
+        stats = self.cache.stats
+        lookups = {'exact': (stats['memoryHits'] + stats['diskHits'], stats['misses'])}
+        for provider in self.providers.values():
+            if provider.semantic_cache:
+                semantic = provider.semantic_cache.stats
+                lookups[f'semantic:{provider.name}'] = (semantic['hits'], semantic['misses'])
+        return lookups
+
+    def health(self):
+        """Gateway health with every provider's health nested"""
+        providers = {name: provider.health() for name, provider in self.providers.items()}
+        return {
+            'status': 'healthy' if all(p['status'] == 'healthy' for p in providers.values()) else 'degraded',
+            'service': self.service,
+            'timestamp': datetime.now().isoformat(),
+            'providers': providers,
+            'pools': self.pools.snapshot()
+        }
+
+def create_app(providers, prefix, service, base_dir):
+    """Build the ASGI app serving the given providers
+
+    prefix selects the <PREFIX>_CACHE_*, _REQUEUE_* and _TRACE_* settings
+    of the shared components; base_dir holds cache.db and traces.jsonl.
+    """
+    app = Quart(service)
+    gateway = Gateway(providers, prefix, service, base_dir)
+    app.gateway = gateway
+
+    for provider in providers:
+        app.register_blueprint(provider.blueprint())
+
+    gateway.metrics.install(app)
+    gateway.metrics.cache_ratios(gateway.cache_lookups)
+    gateway.tracer.install(app)
+
+    @app.before_serving
+    async def startup():
+        """Create and warm the shared pools, then let providers build their clients"""
+        await gateway.pools.start()
+        for provider in providers:
+            await provider.memory.start()
+            await provider.start(gateway.pools)
+
+    @app.after_serving
+    async def shutdown():
+        """Close provider clients, flush memory and close the shared pools"""
+        for provider in providers:
+            await provider.close()
+            await provider.memory.close()
+        await gateway.pools.close()
+
+    @app.route('/health', methods=['GET'])
+    async def health():
+        """Health check endpoint; a single-provider server reports that provider"""
+        if len(providers) == 1:
+            return jsonify(providers[0].health())
+        return jsonify(gateway.health())
+
+    return app
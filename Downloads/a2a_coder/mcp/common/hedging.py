@@ -0,0 +1,104 @@
+"""
+Jittered retries and hedged requests for upstream calls
+
+Retryable failures are retried with full-jitter exponential backoff.
+With hedging on, an attempt still running after the observed latency
+quantile for its key gets a duplicate; whichever answers first wins and
+the other is cancelled.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+
+class HedgedCaller:
+    """Wraps single upstream attempts with retries and optional hedging"""
+
+    def __init__(self, retries=2, backoff_base=0.2, backoff_max=5.0, hedge=False,
+                 hedge_quantile=0.95, hedge_min_samples=20, window=500):
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.window = window
+        self.latencies = {}
+        self.stats = {
+            'calls': 0,
+            'retries': 0,
+            'hedges': 0,
+            'hedgeWins': 0
+        }
+
+    async def call(self, key, attempt, is_retryable):
+        """Run attempt() until it succeeds, a failure isn't retryable, or retries run out"""
+        self.stats['calls'] += 1
+        for retry in range(self.retries + 1):
+            try:
+                return await self._hedged(key, attempt)
+            except Exception as e:
+                if retry == self.retries or not is_retryable(e):
+                    raise
+            self.stats['retries'] += 1
+            await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry)))
+
+    def hedge_delay(self, key):
+        """Latency quantile (seconds) after which a duplicate is sent, or None"""
+        samples = self.latencies.get(key)
+        if not self.hedge or not samples or len(samples) < self.hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_quantile))]
+
+    def snapshot(self):
+        """Retry and hedge counters plus the current hedge delay per key"""
+        return {
+            **self.stats,
+            'hedgeEnabled': self.hedge,
+            'hedgeWinRatio': self.stats['hedgeWins'] / self.stats['hedges'] if self.stats['hedges'] else 0.0,
+            'hedgeDelayMs': {
+                key: round(delay * 1000, 1)
+                for key in self.latencies
+                if (delay := self.hedge_delay(key)) is not None
+            }
+        }
+
+    async def _timed(self, key, attempt):
+        started = time.monotonic()
+        result = await attempt()
+        self.latencies.setdefault(key, deque(maxlen=self.window)).append(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, key, attempt):
+        delay = self.hedge_delay(key)
+        if delay is None:
+            return await self._timed(key, attempt)
+
+        primary = asyncio.ensure_future(self._timed(key, attempt))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+
+            self.stats['hedges'] += 1
+            backup = asyncio.ensure_future(self._timed(key, attempt))
+            tasks.append(backup)
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats['hedgeWins'] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancel the losing attempt, or both if our caller went away
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
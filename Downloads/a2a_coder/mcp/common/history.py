@@ -0,0 +1,199 @@
+"""
+SQLite memory backend with the full interaction history
+
+Every exchange is a row in a WAL-mode database indexed by time, model and
+session, so several worker processes of one server can write at once and
+/context can page through past exchanges. The latest row is the memory
+the other backends keep.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from common.memory import exchange
+
+class HistoryStore:
+    """Interaction history in memory.db, one row per exchange"""
+
+    keeps_history = True
+
+    def __init__(self, path, metrics, tracer, snapshot_path=None, synchronous='NORMAL', busy_timeout=5000, max_page=200):
+        self.path = path
+        self.metrics = metrics
+        self.tracer = tracer
+        self.max_page = max_page
+        self.lock = threading.Lock()
+        self.stats = {
+            'records': 0,
+            'queries': 0,
+            'writeErrors': 0
+        }
+
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets other processes read while one writes; writers queue on the busy timeout
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+        self.db.execute(f'PRAGMA synchronous={synchronous}')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS interactions ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, model TEXT, session TEXT, '
+            'prompt TEXT NOT NULL, reply TEXT NOT NULL, usage TEXT NOT NULL)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS interactions_ts ON interactions (ts)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS interactions_model_ts ON interactions (model, ts)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS interactions_session_ts ON interactions (session, ts)')
+        # Rows ever written, kept current by insert_many so /health never queries on the event loop
+        self.written = self.max_id()
+        if snapshot_path:
+            self.import_snapshot(snapshot_path)
+
+    @classmethod
+    def from_env(cls, prefix, path, metrics, tracer):
+        """Build from <PREFIX>_MEMORY_DB and <PREFIX>_MEMORY_SQLITE_* settings; path is the old memory.json"""
+        return cls(
+            os.getenv(f'{prefix}_MEMORY_DB') or os.path.splitext(path)[0] + '.db',
+            metrics,
+            tracer,
+            snapshot_path=path,
+            synchronous=os.getenv(f'{prefix}_MEMORY_SQLITE_SYNC', 'NORMAL').upper(),
+            busy_timeout=int(os.getenv(f'{prefix}_MEMORY_SQLITE_BUSY_MS', 5000)),
+            max_page=int(os.getenv(f'{prefix}_MEMORY_MAX_PAGE', 200))
+        )
+
+    def import_snapshot(self, snapshot_path):
+        """Seed an empty database with the exchange memory.json holds"""
+        with self.lock:
+            if self.db.execute('SELECT 1 FROM interactions LIMIT 1').fetchone():
+                return
+            try:
+                with open(snapshot_path, 'r') as f:
+                    memory = json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                return
+            if memory.get('lastPrompt') is None:
+                return
+            try:
+                ts = datetime.fromisoformat(memory['timestamp']).timestamp()
+            except (KeyError, TypeError, ValueError):
+                ts = time.time()
+            row = (ts, memory.get('lastModel'), None, memory['lastPrompt'], memory.get('lastReply', ''),
+                   json.dumps(memory.get('usage') or {}, default=str))
+        self.insert_many([row])
+
+    async def start(self):
+        """Nothing to start; writes go straight to the database"""
+
+    async def close(self):
+        with self.lock:
+            self.db.close()
+
+    def load(self):
+        """The latest exchange, in memory.json's shape"""
+        with self.tracer.span('memory.load'), self.metrics.memory_seconds.time('load'), self.lock:
+            row = self.db.execute(
+                'SELECT id, ts, model, session, prompt, reply, usage FROM interactions ORDER BY ts DESC, id DESC LIMIT 1'
+            ).fetchone()
+        if not row:
+            return {}
+        item = self.item(row)
+        return {
+            'lastPrompt': item['prompt'],
+            'lastReply': item['reply'],
+            'lastModel': item['model'],
+            'timestamp': item['timestamp'],
+            'usage': item['usage']
+        }
+
+    async def record(self, prompt, reply, model, usage, session=None):
+        """Append one exchange to the history"""
+        memory = exchange(prompt, reply, model, usage)
+        with self.tracer.span('memory.save'):
+            await self.write([{**memory, 'session': session}])
+        return memory
+
+    async def write(self, memories):
+        """Insert exchanges in one transaction"""
+        rows = [
+            (datetime.fromisoformat(memory['timestamp']).timestamp(), memory['lastModel'], memory.get('session'),
+             memory['lastPrompt'], memory['lastReply'], json.dumps(memory['usage'], default=str))
+            for memory in memories
+        ]
+        with self.metrics.memory_seconds.time('save'):
+            try:
+                await asyncio.to_thread(self.insert_many, rows)
+                self.stats['records'] += len(rows)
+            except sqlite3.Error as e:
+                self.stats['writeErrors'] += 1
+                print(f"Error updating memory: {e}")
+
+    def insert_many(self, rows):
+        with self.lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                self.db.executemany(
+                    'INSERT INTO interactions (ts, model, session, prompt, reply, usage) VALUES (?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+            except BaseException:
+                self.db.execute('ROLLBACK')
+                raise
+            self.db.execute('COMMIT')
+            self.written = self.max_id()
+
+    def max_id(self):
+        # AUTOINCREMENT ids never repeat, so the max id counts rows ever written, by any process, without a scan
+        return self.db.execute('SELECT COALESCE(MAX(id), 0) FROM interactions').fetchone()[0]
+
+    async def history(self, limit=20, cursor=None, since=None, until=None, model=None, session=None):
+        """One page of exchanges, newest first
+
+        since/until are epoch seconds; cursor is the nextCursor of the
+        previous page. Keyset paging keeps deep pages as cheap as the first.
+        """
+        limit = max(1, min(int(limit), self.max_page))
+        clauses, params = [], []
+        for column, op, value in (('ts', '>=', since), ('ts', '<', until), ('model', '=', model), ('session', '=', session)):
+            if value is not None:
+                clauses.append(f'{column} {op} ?')
+                params.append(value)
+        if cursor:
+            ts, _, row_id = str(cursor).partition(':')
+            clauses.append('(ts < ? OR (ts = ? AND id < ?))')
+            params.extend([float(ts), float(ts), int(row_id or 0)])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self.tracer.span('memory.history'), self.metrics.memory_seconds.time('history'):
+            rows = await asyncio.to_thread(self.select_page, where, (*params, limit + 1))
+        self.stats['queries'] += 1
+
+        items = [self.item(row) for row in rows[:limit]]
+        next_cursor = f'{rows[limit - 1][1]!r}:{rows[limit - 1][0]}' if len(rows) > limit else None
+        return {'items': items, 'nextCursor': next_cursor}
+
+    def select_page(self, where, params):
+        with self.lock:
+            return self.db.execute(
+                f'SELECT id, ts, model, session, prompt, reply, usage FROM interactions {where} '
+                'ORDER BY ts DESC, id DESC LIMIT ?',
+                params
+            ).fetchall()
+
+    def item(self, row):
+        row_id, ts, model, session, prompt, reply, usage = row
+        return {
+            'id': row_id,
+            'timestamp': datetime.fromtimestamp(ts).isoformat(),
+            'model': model,
+            'session': session,
+            'prompt': prompt,
+            'reply': reply,
+            'usage': json.loads(usage)
+        }
+
+    def snapshot(self):
+        return {**self.stats, 'backend': 'sqlite', 'interactions': self.written}
@@ -0,0 +1,403 @@
+"""
+Provider memory: an append-only log over a compacted JSON snapshot
+
+State lives in process. Each record appends one compact JSON line to
+memory.log; a writer task group-commits pending lines with one write and
+one fsync. Startup replays the log over memory.json, and a compactor
+periodically folds the state back into memory.json and truncates the log.
+A torn final line from a crash is skipped on replay.
+"""
+
+import asyncio
+import importlib
+import json
+import os
+import time
+from datetime import datetime
+
+# Memory backends by <PREFIX>_MEMORY_BACKEND; 'module:Class' paths also work
+MEMORY_BACKENDS = {
+    'log': 'common.memory:MemoryStore',
+    'sqlite': 'common.history:HistoryStore'
+}
+
+def memory_from_env(prefix, path, metrics, tracer, provider):
+    """Build the memory backend <PREFIX>_MEMORY_BACKEND selects (default: log)
+
+    Unless <PREFIX>_MEMORY_WRITE_BEHIND=false it is wrapped in a
+    WriteBehindMemory, which takes the backend off the request path.
+    """
+    backend = os.getenv(f'{prefix}_MEMORY_BACKEND', 'log')
+    module, _, attr = MEMORY_BACKENDS.get(backend, backend).partition(':')
+    store = getattr(importlib.import_module(module), attr).from_env(prefix, path, metrics, tracer)
+    if os.getenv(f'{prefix}_MEMORY_WRITE_BEHIND', 'true').lower() != 'true':
+        return store
+    return WriteBehindMemory(
+        store,
+        metrics,
+        tracer,
+        provider,
+        flush_interval=float(os.getenv(f'{prefix}_MEMORY_FLUSH_MS', 1000)) / 1000,
+        flush_size=int(os.getenv(f'{prefix}_MEMORY_FLUSH_SIZE', 64))
+    )
+
+def exchange(prompt, reply, model, usage):
+    """The memory shape for one prompt/reply exchange"""
+    return {
+        'lastPrompt': prompt,
+        'lastReply': reply,
+        'lastModel': model,
+        'timestamp': datetime.now().isoformat(),
+        'usage': usage or {}
+    }
+
+class MemoryStore:
+    """One provider's memory, rebuilt from memory.json plus memory.log"""
+
+    keeps_history = False
+
+    def __init__(self, path, metrics, tracer, durable=True, fsync_interval=0.005, fsync_batch=128,
+                 compact_interval=300, compact_bytes=1 << 20):
+        self.path = path
+        self.log_path = os.path.splitext(path)[0] + '.log'
+        self.metrics = metrics
+        self.tracer = tracer
+        self.durable = durable
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.compact_interval = compact_interval
+        self.compact_bytes = compact_bytes
+
+        self.state = {}
+        self.pending = []
+        self.log = None
+        self.log_bytes = 0
+        self.wake = None
+        self.lock = None
+        self.tasks = []
+        self.stats = {
+            'records': 0,
+            'replayed': 0,
+            'batches': 0,
+            'fsyncs': 0,
+            'maxBatch': 0,
+            'compactions': 0,
+            'lastCompaction': None,
+            'writeErrors': 0
+        }
+        self.rebuild()
+
+    @classmethod
+    def from_env(cls, prefix, path, metrics, tracer):
+        """Build from <PREFIX>_MEMORY_* settings"""
+        return cls(
+            path,
+            metrics,
+            tracer,
+            durable=os.getenv(f'{prefix}_MEMORY_DURABLE', 'true').lower() == 'true',
+            fsync_interval=float(os.getenv(f'{prefix}_MEMORY_FSYNC_MS', 5)) / 1000,
+            fsync_batch=int(os.getenv(f'{prefix}_MEMORY_FSYNC_BATCH', 128)),
+            compact_interval=float(os.getenv(f'{prefix}_MEMORY_COMPACT_SECONDS', 300)),
+            compact_bytes=int(os.getenv(f'{prefix}_MEMORY_COMPACT_BYTES', 1 << 20))
+        )
+
+    def rebuild(self):
+        """Load the snapshot and replay the log over it"""
+        with self.metrics.memory_seconds.time('rebuild'):
+            try:
+                with open(self.path, 'r') as f:
+                    self.state = json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                self.state = {}
+
+            try:
+                with open(self.log_path, 'r+b') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            # Torn write at the tail; drop it so new lines start clean
+                            f.truncate(self.log_bytes)
+                            break
+                        self.log_bytes += len(line)
+                        self.apply(entry)
+                        self.stats['replayed'] += 1
+            except FileNotFoundError:
+                pass
+
+    def apply(self, entry):
+        """Apply one log entry to the in-process state"""
+        self.state.update(entry.get('set', {}))
+
+    async def start(self):
+        """Open the log and start the writer and compactor tasks"""
+        self.wake = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.log = open(self.log_path, 'ab')
+        self.tasks = [asyncio.create_task(self.writer()), asyncio.create_task(self.compactor())]
+
+    async def close(self):
+        """Flush pending records, stop the background tasks and compact"""
+        if self.log:
+            await self.flush()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.log:
+            await self.compact()
+            self.log.close()
+            self.log = None
+
+    def load(self):
+        """Current memory, served from process state"""
+        with self.tracer.span('memory.load'), self.metrics.memory_seconds.time('load'):
+            return dict(self.state)
+
+    async def record(self, prompt, reply, model, usage, session=None):
+        """Store the latest exchange and its token usage in memory"""
+        memory = exchange(prompt, reply, model, usage)
+        with self.tracer.span('memory.save'):
+            await self.write([memory])
+        return memory
+
+    async def write(self, memories):
+        """Apply exchanges to the state and append their log lines"""
+        # Sessions only matter to backends that keep history
+        entries = [{'set': {key: value for key, value in memory.items() if key != 'session'}} for memory in memories]
+        for entry in entries:
+            self.apply(entry)
+        self.stats['records'] += len(entries)
+        await self.append(entries)
+
+    async def history(self, **filters):
+        """The log keeps only the latest exchange, so there is no history to page"""
+        return None
+
+    async def append(self, entries):
+        """Queue log lines; waits for their fsync when durable"""
+        line = b''.join((json.dumps(entry, separators=(',', ':'), default=str) + '\n').encode() for entry in entries)
+        if self.log is None:
+            # Not started (e.g. used outside a serving app): write through
+            with open(self.log_path, 'ab') as f:
+                f.write(line)
+            self.log_bytes += len(line)
+            return
+
+        done = asyncio.get_running_loop().create_future()
+        self.pending.append((line, done))
+        self.wake.set()
+        if self.durable:
+            await done
+
+    async def writer(self):
+        """Group-commit pending lines: one write and one fsync per batch"""
+        while True:
+            await self.wake.wait()
+            # Let concurrent records join the batch unless it's already full
+            if len(self.pending) < self.fsync_batch:
+                await asyncio.sleep(self.fsync_interval)
+            self.wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write and fsync everything pending"""
+        async with self.lock:
+            while self.pending:
+                batch, self.pending = self.pending[:self.fsync_batch], self.pending[self.fsync_batch:]
+                data = b''.join(line for line, _ in batch)
+                try:
+                    with self.metrics.memory_seconds.time('append'):
+                        await asyncio.to_thread(self.write_batch, data)
+                    self.log_bytes += len(data)
+                    self.stats['batches'] += 1
+                    self.stats['fsyncs'] += 1
+                    self.stats['maxBatch'] = max(self.stats['maxBatch'], len(batch))
+                except OSError as e:
+                    # As before, a failed memory write never fails the completion
+                    self.stats['writeErrors'] += 1
+                    print(f"Error updating memory: {e}")
+                for _, done in batch:
+                    if not done.done():
+                        done.set_result(None)
+
+    def write_batch(self, data):
+        self.log.write(data)
+        self.log.flush()
+        os.fsync(self.log.fileno())
+
+    async def compactor(self):
+        """Fold the log into the snapshot on an interval or once it grows past the size cap"""
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(min(self.compact_interval, 5))
+            if self.log_bytes >= self.compact_bytes or time.monotonic() - last >= self.compact_interval:
+                if self.log_bytes:
+                    await self.compact()
+                last = time.monotonic()
+
+    async def compact(self):
+        """Write the state to memory.json atomically, then truncate the log"""
+        async with self.lock:
+            # Lines still pending are set-patches, so replaying them over this snapshot is harmless
+            state = dict(self.state)
+            try:
+                with self.metrics.memory_seconds.time('compact'):
+                    await asyncio.to_thread(self.write_snapshot, state)
+            except OSError as e:
+                print(f"Error compacting memory: {e}")
+                return
+            self.log_bytes = 0
+            self.stats['compactions'] += 1
+            self.stats['lastCompaction'] = datetime.now().isoformat()
+
+    def write_snapshot(self, state):
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f, indent=2, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        if self.log:
+            self.log.truncate(0)
+        else:
+            open(self.log_path, 'wb').close()
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            'backend': 'log',
+            'pending': len(self.pending),
+            'logBytes': self.log_bytes,
+            'durable': self.durable
+        }
+
+class WriteBehindMemory:
+    """Serves memory from RAM and flushes records to a backend in the background
+
+    Records land in a dirty list that a flusher drains once it holds
+    flush_size records or flush_interval after the first one, whichever
+    comes first, and once more on shutdown. Backends that keep only the
+    latest exchange get just the newest dirty record. A failed write puts
+    the batch back at the head of the list for the next flush. Each flush
+    is traced as a root span linked to the requests whose records it wrote.
+    """
+
+    def __init__(self, store, metrics, tracer, provider, flush_interval=1.0, flush_size=64):
+        self.store = store
+        self.metrics = metrics
+        self.tracer = tracer
+        self.provider = provider
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.keeps_history = store.keeps_history
+        self.memory = store.load()
+        self.dirty = []
+        self.links = []
+        self.has_dirty = None
+        self.full = None
+        self.task = None
+        self.stats = {
+            'flushes': 0,
+            'flushedRecords': 0,
+            'coalesced': 0,
+            'lastFlushMs': 0.0,
+            'maxFlushMs': 0.0,
+            'lastFlush': None,
+            'flushErrors': 0
+        }
+
+    async def start(self):
+        await self.store.start()
+        self.has_dirty = asyncio.Event()
+        self.full = asyncio.Event()
+        self.task = asyncio.create_task(self.flusher())
+
+    async def close(self):
+        """Stop the flusher, flush what's left and close the backend"""
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+        await self.store.close()
+
+    def load(self):
+        """Current memory, served from RAM"""
+        with self.tracer.span('memory.load'), self.metrics.memory_seconds.time('load'):
+            return dict(self.memory)
+
+    async def record(self, prompt, reply, model, usage, session=None):
+        """Update memory in RAM and queue the record for the next flush"""
+        memory = exchange(prompt, reply, model, usage)
+        self.memory = memory
+        self.dirty.append({**memory, 'session': session} if session else memory)
+        self.links.append(self.tracer.link())
+        self.metrics.memory_pending.set(self.provider, value=len(self.dirty))
+        if self.has_dirty:
+            self.has_dirty.set()
+            if len(self.dirty) >= self.flush_size:
+                self.full.set()
+        return memory
+
+    async def history(self, **filters):
+        """Flushed history only; records show up within one flush interval"""
+        return await self.store.history(**filters)
+
+    async def flusher(self):
+        while True:
+            await self.has_dirty.wait()
+            try:
+                await asyncio.wait_for(self.full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if not await self.flush():
+                # Back off rather than retrying a failing backend on every new record
+                await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        """Hand every dirty record to the backend in one write; False if it failed"""
+        batch, self.dirty = self.dirty, []
+        links, self.links = self.links, []
+        if self.has_dirty:
+            self.has_dirty.clear()
+            self.full.clear()
+        self.metrics.memory_pending.set(self.provider, value=0)
+        if not batch:
+            return True
+
+        if not self.keeps_history:
+            self.stats['coalesced'] += len(batch) - 1
+            batch = batch[-1:]
+        started = time.perf_counter()
+        try:
+            with self.tracer.root_span('memory.flush', links, provider=self.provider, records=len(batch)), self.metrics.memory_seconds.time('flush'):
+                await self.store.write(batch)
+        except Exception as e:
+            self.stats['flushErrors'] += 1
+            print(f"Error flushing memory: {e}")
+            # Retry ahead of anything queued since, so the backend still sees records in order
+            self.dirty[:0] = batch
+            self.links[:0] = links
+            self.metrics.memory_pending.set(self.provider, value=len(self.dirty))
+            if self.has_dirty:
+                self.has_dirty.set()
+            return False
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stats['flushes'] += 1
+        self.stats['flushedRecords'] += len(batch)
+        self.stats['lastFlushMs'] = round(elapsed, 3)
+        self.stats['maxFlushMs'] = round(max(self.stats['maxFlushMs'], elapsed), 3)
+        self.stats['lastFlush'] = datetime.now().isoformat()
+        return True
+
+    def snapshot(self):
+        return {
+            **self.store.snapshot(),
+            'writeBehind': {
+                **self.stats,
+                'pending': len(self.dirty),
+                'flushIntervalMs': self.flush_interval * 1000,
+                'flushSize': self.flush_size
+            }
+        }
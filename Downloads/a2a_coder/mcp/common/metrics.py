@@ -0,0 +1,271 @@
+"""
+Prometheus-style metrics for the provider servers
+
+Counters, gauges and histograms are plain dicts keyed by label values.
+Every update happens on the event loop thread, so the hot path is a dict
+lookup and an add with no locking. Values are rendered in the Prometheus
+text exposition format when /metrics is scraped.
+"""
+
+import bisect
+import time
+from contextlib import contextmanager
+
+from quart import request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+IO_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+def format_labels(names, values, extra=None):
+    """Render a {name="value",...} label set"""
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, self.labels, labels, value
+
+class Gauge(Counter):
+    """Value per label set that can go up and down"""
+
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, *labels, value):
+        self.values[labels] = value
+
+    @contextmanager
+    def track(self, *labels):
+        """Count the body as in progress while it runs"""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+class Histogram:
+    """Bucketed observations per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            # Per-bucket counts plus overflow, then sum
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the body's wall time in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self):
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                yield f'{self.name}_bucket', self.labels, labels, cumulative, [('le', format_value(float(bound)))]
+            yield f'{self.name}_sum', self.labels, labels, series[-1]
+            yield f'{self.name}_count', self.labels, labels, cumulative
+
+class Callback:
+    """Metric whose values are read from fn() at scrape time"""
+
+    def __init__(self, name, help, kind, labels, fn):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.fn = fn
+
+    def samples(self):
+        for labels, value in self.fn().items():
+            yield self.name, self.labels, labels, value
+
+class Registry:
+    """Holds metrics and renders them for a scrape"""
+
+    def __init__(self, const_labels=None):
+        self.const_labels = list((const_labels or {}).items())
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name, help, kind, labels, fn):
+        """Register a metric computed on scrape; fn returns {label values tuple: value}"""
+        return self.register(Callback(name, help, kind, labels, fn))
+
+    def render(self):
+        """Text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, label_names, label_values, value, *extra in metric.samples():
+                labels = format_labels(label_names, label_values, (extra[0] if extra else []) + self.const_labels)
+                lines.append(f'{name}{labels} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+class MetricsMiddleware:
+    """ASGI wrapper that times each request until its last body chunk is sent
+
+    Streaming responses finish long after the view returns, so timing and
+    the in-flight gauge live here rather than in request hooks. Route and
+    model labels are left in the ASGI scope by an after_request hook.
+    """
+
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_and_record(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        self.metrics.requests_inflight.inc()
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            self.metrics.requests_inflight.dec()
+            route, model = scope.get('mcp.metrics', ('unmatched', ''))
+            self.metrics.requests.inc(route, model, str(status))
+            self.metrics.request_seconds.observe(time.perf_counter() - started, route, model)
+
+class ServerMetrics:
+    """The standard metric set shared by the provider servers"""
+
+    def __init__(self, service):
+        # Model label for requests that don't name one, and the models each
+        # blueprint serves; anything else is labelled 'other' to bound cardinality
+        self.default_models = {}
+        self.known_models = {}
+        self.registry = Registry({'service': service})
+        self.requests = self.registry.counter(
+            'mcp_requests_total', 'HTTP requests by route, model and status', ('route', 'model', 'status'))
+        self.request_seconds = self.registry.histogram(
+            'mcp_request_duration_seconds', 'Total request time including streamed bodies', ('route', 'model'))
+        self.upstream_seconds = self.registry.histogram(
+            'mcp_upstream_duration_seconds', 'Time spent in upstream completion calls', ('model',))
+        self.memory_seconds = self.registry.histogram(
+            'mcp_memory_io_duration_seconds', 'Memory store I/O time', ('op',), IO_BUCKETS)
+        self.memory_pending = self.registry.gauge(
+            'mcp_memory_pending_writes', 'Memory records waiting for a write-behind flush', ('provider',))
+        self.tokens = self.registry.counter(
+            'mcp_tokens_total', 'Tokens reported by upstream usage', ('model', 'type'))
+        self.requests_inflight = self.registry.gauge(
+            'mcp_requests_in_flight', 'HTTP requests currently being served')
+        self.upstream_inflight = self.registry.gauge(
+            'mcp_upstream_in_flight', 'Upstream calls currently outstanding', ('model',))
+
+    def install(self, app):
+        """Wrap the app's ASGI handler, label requests and serve /metrics"""
+        app.asgi_app = MetricsMiddleware(app.asgi_app, self)
+
+        @app.after_request
+        async def label_request(response):
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            model = ''
+            if request.method == 'POST':
+                data = await request.get_json(silent=True)
+                if isinstance(data, dict):
+                    model = self.model_label(request.blueprint, data.get('model', self.default_models.get(request.blueprint, '')))
+            request.scope['mcp.metrics'] = (route, str(model))
+            return response
+
+        @app.route('/metrics', methods=['GET'])
+        async def metrics():
+            """Prometheus scrape endpoint"""
+            return self.registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    def count_tokens(self, model, prompt_tokens, completion_tokens):
+        """Add one upstream call's usage to the token counters"""
+        self.tokens.inc(model, 'prompt', amount=prompt_tokens or 0)
+        self.tokens.inc(model, 'completion', amount=completion_tokens or 0)
+
+    def model_label(self, provider, model):
+        """model if the provider serves it, else 'other', so clients can't mint new series"""
+        return model if isinstance(model, str) and model in self.known_models.get(provider, ()) else 'other'
+
+    @contextmanager
+    def upstream(self, model):
+        """Time an upstream call and count it as in flight"""
+        with self.upstream_inflight.track(model), self.upstream_seconds.time(model):
+            yield
+
+    def cache_ratios(self, snapshots):
+        """Export hit/miss counters and hit ratios read from cache snapshots at scrape time
+
+        snapshots() returns {cache name: (hits, misses)}.
+        """
+        self.registry.callback(
+            'mcp_cache_lookups_total', 'Cache lookups by cache and result', 'counter', ('cache', 'result'),
+            lambda: {
+                (cache, result): count
+                for cache, (hits, misses) in snapshots().items()
+                for result, count in (('hit', hits), ('miss', misses))
+            }
+        )
+        self.registry.callback(
+            'mcp_cache_hit_ratio', 'Share of cache lookups answered from the cache', 'gauge', ('cache',),
+            lambda: {
+                (cache,): hits / (hits + misses) if hits + misses else 0.0
+                for cache, (hits, misses) in snapshots().items()
+            }
+        )
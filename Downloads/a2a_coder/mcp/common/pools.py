@@ -0,0 +1,94 @@
+"""
+Shared upstream connection pools
+
+Providers register the upstream origins they talk to; the manager keeps
+one pooled keep-alive httpx client per origin, so providers pointed at
+the same host share connections. Clients are created and warmed when
+serving starts (binding them to the serving loop) and closed on shutdown.
+"""
+
+import asyncio
+from urllib.parse import urlsplit
+
+import httpx
+
+def origin_of(url):
+    """scheme://host[:port] of a URL"""
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}'
+
+class PoolManager:
+    """One pooled client per upstream origin"""
+
+    def __init__(self):
+        self.specs = {}
+        self.warmups = {}
+        self.clients = {}
+
+    def register(self, base_url, max_connections=100, keepalive_connections=20, keepalive_expiry=60,
+                 http2=False, timeout=30, warm_url=None, warm_headers=None, warm_connections=0):
+        """Declare an origin's pool; repeated registrations widen it to fit every provider"""
+        origin = origin_of(base_url)
+        spec = self.specs.get(origin)
+        if spec:
+            spec['max_connections'] = max(spec['max_connections'], max_connections)
+            spec['keepalive_connections'] = max(spec['keepalive_connections'], keepalive_connections)
+            spec['keepalive_expiry'] = max(spec['keepalive_expiry'], keepalive_expiry)
+            spec['http2'] = spec['http2'] or http2
+            spec['timeout'] = max(spec['timeout'], timeout)
+        else:
+            self.specs[origin] = {
+                'max_connections': max_connections,
+                'keepalive_connections': keepalive_connections,
+                'keepalive_expiry': keepalive_expiry,
+                'http2': http2,
+                'timeout': timeout
+            }
+        if warm_url and warm_connections > 0:
+            self.warmups[origin] = (warm_url, warm_headers or {}, warm_connections)
+
+    def client(self, url):
+        """The started client for a URL's origin"""
+        return self.clients[origin_of(url)]
+
+    async def start(self):
+        """Create every registered client and open keep-alive connections ahead of traffic"""
+        for origin, spec in self.specs.items():
+            self.clients[origin] = httpx.AsyncClient(
+                http2=spec['http2'],
+                limits=httpx.Limits(
+                    max_connections=spec['max_connections'],
+                    max_keepalive_connections=spec['keepalive_connections'],
+                    keepalive_expiry=spec['keepalive_expiry']
+                ),
+                timeout=spec['timeout']
+            )
+        await asyncio.gather(*(self._warm(origin, *warmup) for origin, warmup in self.warmups.items()))
+
+    async def close(self):
+        """Close every client"""
+        await asyncio.gather(*(client.aclose() for client in self.clients.values()))
+        self.clients = {}
+
+    def snapshot(self):
+        """Pool limits per origin"""
+        return {
+            origin: {
+                'maxConnections': spec['max_connections'],
+                'keepaliveConnections': spec['keepalive_connections'],
+                'http2': spec['http2']
+            }
+            for origin, spec in self.specs.items()
+        }
+
+    async def _warm(self, origin, url, headers, count):
+        client = self.clients[origin]
+
+        async def touch():
+            try:
+                await client.get(url, headers=headers)
+            except httpx.HTTPError as e:
+                print(f"[MCP] Pool warm-up for {origin} failed: {e}")
+
+        # With HTTP/2 every request multiplexes over one connection
+        await asyncio.gather(*(touch() for _ in range(1 if self.specs[origin]['http2'] else count)))
@@ -0,0 +1,458 @@
+"""
+Provider plugin interface
+
+A provider adapts one upstream LLM API. Subclasses supply the upstream
+calls (create_completion, open_stream) and a few classifiers; the base
+class runs them through the gateway's shared cache, single-flight,
+scheduler and pools, and serves the /mcp/<name>/* routes every provider
+exposes.
+"""
+
+import asyncio
+import os
+import time
+from contextlib import aclosing
+from datetime import datetime
+
+from quart import Blueprint, jsonify, make_response, request
+
+from common.breaker import BreakerRegistry, CircuitOpenError
+from common.cache import cache_key
+from common.memory import memory_from_env
+from common.scheduler import estimate_tokens, limits_from_env
+from common.sessions import SessionStore
+from common.sse import circuit_open_response, sse_event
+
+def context_text(history):
+    """Text of session history messages, for token estimates"""
+    return ''.join(message['content'] for message in history)
+
+class Provider:
+    """Base class for a provider hosted by the gateway"""
+
+    name = None
+    service = None
+    prefix = None
+    models = ()
+    default_model = None
+
+    def __init__(self, memory_path):
+        self.memory_path = os.getenv(f'{self.prefix}_MEMORY_PATH', memory_path)
+        # Cap on concurrent upstream calls; excess requests wait their turn
+        self.max_inflight = int(os.getenv(f'{self.prefix}_MAX_INFLIGHT', 256))
+        self.batch_concurrency = int(os.getenv(f'{self.prefix}_BATCH_CONCURRENCY', 8))
+        self.batch_max_items = int(os.getenv(f'{self.prefix}_BATCH_MAX_ITEMS', 100))
+        self.semantic_cache = None
+        self.gateway = None
+
+    def attach(self, gateway):
+        """Bind the provider to the gateway's shared cache, scheduler, pools and telemetry"""
+        self.gateway = gateway
+        self.inflight = asyncio.Semaphore(self.max_inflight)
+        self.breakers = BreakerRegistry.from_env(self.name, self.prefix)
+        self.memory = memory_from_env(self.prefix, self.memory_path, gateway.metrics, gateway.tracer, self.name)
+        self.sessions = SessionStore.from_env(self.prefix, self.summarize, self.default_model)
+        gateway.scheduler.add_profile(self.name, *limits_from_env(self.prefix, self.max_inflight))
+        gateway.metrics.default_models[self.name] = self.default_model
+        gateway.metrics.known_models[self.name] = frozenset(self.models)
+        self.register_pools(gateway.pools)
+
+    def register_pools(self, pools):
+        """Declare the upstream origins this provider calls"""
+
+    async def start(self, pools):
+        """Set up clients once the shared pools exist"""
+
+    async def close(self):
+        """Release provider resources on shutdown"""
+
+    def configuration_error(self):
+        """A message when the provider can't serve requests, e.g. a missing key"""
+        return None
+
+    async def create_completion(self, prompt, model, max_tokens, temperature, history=()):
+        """Run one upstream completion and return (reply, usage)
+
+        history holds chat messages to send ahead of the prompt.
+        """
+        raise NotImplementedError
+
+    async def open_stream(self, prompt, model, max_tokens, temperature, history=()):
+        """Open a streaming completion; return an async iterator of {'delta'} / {'usage'} chunks"""
+        raise NotImplementedError
+
+    def is_throttled(self, error):
+        """True for the provider's rate-limit errors"""
+        return False
+
+    def is_upstream_failure(self, error):
+        """True for errors that count against the circuit breaker"""
+        return False
+
+    def token_counts(self, usage):
+        """(prompt, completion, total) tokens from a usage block"""
+        return 0, 0, 0
+
+    def describe_error(self, error):
+        """The error message returned to callers"""
+        return str(error)
+
+    def health_extras(self):
+        """Provider-specific fields for /health"""
+        return {}
+
+    def cache_extras(self):
+        """Provider-specific fields for the cache stats route"""
+        return {}
+
+    def scheduler_extras(self):
+        """Provider-specific fields for the scheduler stats route"""
+        return {}
+
+    async def call_upstream(self, prompt, model, max_tokens, temperature, history=()):
+        """One upstream completion under the in-flight cap, timed and traced"""
+        metrics = self.gateway.metrics
+        label = metrics.model_label(self.name, model)
+        async with self.inflight:
+            with self.gateway.tracer.span('upstream.call', model=model), metrics.upstream(label):
+                reply, usage = await self.create_completion(prompt, model, max_tokens, temperature, history)
+        metrics.count_tokens(label, *self.token_counts(usage)[:2])
+        return reply, usage
+
+    async def complete(self, prompt, model, max_tokens=512, temperature=0.7, use_cache=True, history=()):
+        """Serve a completion from the exact or semantic cache, falling back to upstream
+
+        Returns (reply, usage, hit) where hit describes how the cache answered.
+        Replies that depend on session history are neither cached nor coalesced.
+        """
+        use_cache = use_cache and not history
+        cache = self.gateway.cache
+        # The cache, single-flight table and semantic scopes are shared across providers
+        key = cache_key(self.name, prompt, model, temperature, max_tokens)
+        scope = f'{self.name}|{model}|{float(temperature)}|{int(max_tokens)}'
+        if use_cache:
+            entry = await cache.get(key)
+            if entry:
+                return entry['reply'], entry['usage'], {'cached': True}
+
+            if self.semantic_cache:
+                try:
+                    entry, similarity = await self.semantic_cache.lookup(prompt, scope)
+                    if entry:
+                        return entry['reply'], entry['usage'], {'cached': True, 'similarity': similarity}
+                except Exception as e:
+                    print(f"[{self.service}] Semantic Cache Error: {e}")
+
+        async def fetch():
+            # Fail fast rather than queueing behind an open circuit
+            self.breakers.check(model)
+            started = time.perf_counter()
+            result = await self.gateway.scheduler.run(
+                model,
+                estimate_tokens(context_text(history) + prompt, max_tokens),
+                lambda: self.breakers.call(
+                    model,
+                    lambda: self.call_upstream(prompt, model, max_tokens, temperature, history),
+                    self.is_upstream_failure
+                ),
+                is_throttled=self.is_throttled,
+                count_tokens=lambda result: self.token_counts(result[1])[2],
+                profile=self.name
+            )
+            if use_cache:
+                await cache.put(key, *result, (time.perf_counter() - started) * 1000)
+                if self.semantic_cache:
+                    try:
+                        await self.semantic_cache.add(prompt, scope, *result)
+                    except Exception as e:
+                        print(f"[{self.service}] Semantic Cache Error: {e}")
+            return result
+
+        if history:
+            reply, usage = await fetch()
+        else:
+            reply, usage = await self.gateway.flights.do(key, fetch)
+        return reply, usage, {'cached': False}
+
+    async def summarize(self, prompt, model, max_tokens):
+        """Rolling session summaries go through the same pipeline as completions"""
+        reply, _, _ = await self.complete(prompt, model, max_tokens, 0.0, use_cache=False)
+        return reply
+
+    async def converse(self, prompt, model, session_id=None, use_cache=True):
+        """A completion within a session: send its window, then add the exchange to it
+
+        Returns (reply, usage, hit, session) where session describes the
+        window, or is None without a session_id.
+        """
+        async with self.sessions.turn(session_id) as session:
+            history = session.context() if session else ()
+            reply, usage, hit = await self.complete(prompt, model, use_cache=use_cache, history=history)
+            if session:
+                self.sessions.add(session, prompt, reply)
+                return reply, usage, hit, session.describe()
+        return reply, usage, hit, None
+
+    async def stream_response(self, prompt, model, max_tokens=512, temperature=0.7, session_id=None):
+        """Relay upstream deltas to the caller as server-sent events"""
+        try:
+            self.breakers.check(model)
+        except CircuitOpenError as e:
+            return circuit_open_response(e)
+
+        gateway = self.gateway
+
+        async def generate():
+            parts = []
+            usage = None
+            async with self.sessions.turn(session_id) as session:
+                history = session.context() if session else ()
+                try:
+                    async with gateway.scheduler.slot(model, estimate_tokens(context_text(history) + prompt, max_tokens), self.name) as outcome, self.inflight:
+                        with gateway.tracer.span('upstream.stream', model=model), gateway.metrics.upstream(gateway.metrics.model_label(self.name, model)):
+                            try:
+                                chunks = await self.breakers.call(
+                                    model,
+                                    lambda: self.open_stream(prompt, model, max_tokens, temperature, history),
+                                    self.is_upstream_failure
+                                )
+                            except Exception as e:
+                                outcome['throttled'] = self.is_throttled(e)
+                                raise
+
+                            async with aclosing(chunks):
+                                async for chunk in chunks:
+                                    # The final chunk carries usage and no delta
+                                    if chunk.get('usage'):
+                                        usage = chunk['usage']
+                                        prompt_tokens, completion_tokens, total = self.token_counts(usage)
+                                        outcome['tokens'] = total or outcome['tokens']
+                                        gateway.metrics.count_tokens(gateway.metrics.model_label(self.name, model), prompt_tokens, completion_tokens)
+                                    if chunk.get('delta'):
+                                        parts.append(chunk['delta'])
+                                        yield sse_event({'delta': chunk['delta']})
+                except CircuitOpenError as e:
+                    yield sse_event({'error': str(e), 'code': 'circuit_open'}, event='error')
+                    return
+                except Exception as e:
+                    yield sse_event({'error': self.describe_error(e)}, event='error')
+                    return
+
+                reply = ''.join(parts) or '[No response]'
+                if session:
+                    self.sessions.add(session, prompt, reply)
+                    described = session.describe()
+
+            memory = await self.memory.record(prompt, reply, model, usage, session_id)
+            done = {'reply': reply, 'memory': memory, 'model': model}
+            if session_id:
+                done['session'] = described
+            yield sse_event(done, event='done')
+
+        response = await make_response(generate(), {
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        # Generation can outlast Quart's default response timeout
+        response.timeout = None
+        return response
+
+    def health(self):
+        """Provider health, degraded while any model's circuit is open"""
+        return {
+            'status': 'degraded' if self.breakers.is_open() else 'healthy',
+            'service': self.service,
+            'timestamp': datetime.now().isoformat(),
+            **self.health_extras(),
+            'circuits': self.breakers.snapshot(),
+            'memory': self.memory.snapshot(),
+            'sessions': self.sessions.snapshot()
+        }
+
+    def blueprint(self):
+        """The /mcp/<name>/* routes"""
+        routes = Blueprint(self.name, __name__, url_prefix=f'/mcp/{self.name}')
+
+        @routes.route('/completion', methods=['POST'])
+        async def completion():
+            """Handle completion requests; "stream": true switches to server-sent events"""
+            try:
+                data = await request.get_json(silent=True)
+                if not isinstance(data, dict):
+                    return jsonify({'error': 'Request body must be a JSON object'}), 400
+                prompt = data.get('prompt', '')
+                model = data.get('model', self.default_model)
+                session_id = data.get('session_id')
+
+                if not prompt:
+                    return jsonify({'error': 'Missing prompt parameter'}), 400
+                if not self.sessions.valid_id(session_id):
+                    return jsonify({'error': 'Invalid session_id parameter'}), 400
+
+                error = self.configuration_error()
+                if error:
+                    return jsonify({'error': error}), 500
+
+                if data.get('stream'):
+                    return await self.stream_response(prompt, model, session_id=session_id)
+
+                reply, usage, hit, session = await self.converse(prompt, model, session_id, data.get('cache', True))
+                memory = await self.memory.record(prompt, reply, model, usage, session_id)
+
+                result = {
+                    'reply': reply,
+                    'memory': memory,
+                    'model': model,
+                    **hit
+                }
+                if session:
+                    result['session'] = session
+                return jsonify(result)
+
+            except CircuitOpenError as e:
+                return circuit_open_response(e)
+            except Exception as e:
+                return jsonify({'error': self.describe_error(e)}), 500
+
+        @routes.route('/completion/stream', methods=['POST'])
+        async def completion_stream():
+            """Relay completion tokens as server-sent events"""
+            data = await request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'error': 'Request body must be a JSON object'}), 400
+            prompt = data.get('prompt', '')
+            model = data.get('model', self.default_model)
+            session_id = data.get('session_id')
+
+            if not prompt:
+                return jsonify({'error': 'Missing prompt parameter'}), 400
+            if not self.sessions.valid_id(session_id):
+                return jsonify({'error': 'Invalid session_id parameter'}), 400
+
+            error = self.configuration_error()
+            if error:
+                return jsonify({'error': error}), 500
+
+            return await self.stream_response(prompt, model, session_id=session_id)
+
+        @routes.route('/completion/batch', methods=['POST'])
+        async def completion_batch():
+            """Run a batch of completions upstream with bounded fan-out"""
+            data = await request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'error': 'Request body must be a JSON object'}), 400
+            items = data.get('items')
+
+            if not isinstance(items, list) or not items:
+                return jsonify({'error': 'Missing items parameter'}), 400
+            if len(items) > self.batch_max_items:
+                return jsonify({'error': f'Batch exceeds {self.batch_max_items} items'}), 400
+            error = self.configuration_error()
+            if error:
+                return jsonify({'error': error}), 500
+
+            # Callers may lower the fan-out but not raise it past the server ceiling
+            try:
+                concurrency = int(data.get('concurrency', self.batch_concurrency))
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Invalid concurrency parameter'}), 400
+            gate = asyncio.Semaphore(max(1, min(concurrency, self.batch_concurrency)))
+
+            # Items are bare prompt strings or objects; batch-level params are the defaults
+            defaults = {
+                'model': data.get('model', self.default_model),
+                'max_tokens': data.get('max_tokens', 512),
+                'temperature': data.get('temperature', 0.7),
+                'cache': data.get('cache', True)
+            }
+            items = [{**defaults, **(item if isinstance(item, dict) else {'prompt': item})} for item in items]
+
+            async def run(item):
+                if not item.get('prompt'):
+                    return {'error': 'Missing prompt parameter', 'model': item['model']}
+                try:
+                    async with gate:
+                        reply, usage, hit = await self.complete(
+                            item['prompt'], item['model'], item['max_tokens'], item['temperature'], item['cache']
+                        )
+                    return {'reply': reply, 'model': item['model'], 'usage': usage, **hit}
+                except CircuitOpenError as e:
+                    return {'error': str(e), 'code': 'circuit_open', 'model': item['model']}
+                except Exception as e:
+                    return {'error': self.describe_error(e), 'model': item['model']}
+
+            results = await asyncio.gather(*(run(item) for item in items))
+
+            # Memory keeps only the latest exchange, so record the last success once
+            succeeded = [(item, result) for item, result in zip(items, results) if 'reply' in result]
+            if succeeded:
+                item, result = succeeded[-1]
+                await self.memory.record(item['prompt'], result['reply'], result['model'], result['usage'])
+
+            return jsonify({
+                'results': results,
+                'succeeded': len(succeeded),
+                'failed': len(results) - len(succeeded)
+            })
+
+        @routes.route('/cache', methods=['GET'])
+        async def cache_stats():
+            """Report response cache hit/miss counters and savings"""
+            return jsonify({
+                'cache': self.gateway.cache.snapshot(),
+                'coalescing': self.gateway.flights.snapshot(),
+                **self.cache_extras()
+            })
+
+        @routes.route('/scheduler', methods=['GET'])
+        async def scheduler_stats():
+            """Report per-model queue depth, wait times and concurrency limits"""
+            return jsonify({'models': self.gateway.scheduler.snapshot(self.name), **self.scheduler_extras()})
+
+        @routes.route('/context', methods=['GET'])
+        async def context():
+            """Get current memory/context, plus a page of history when the backend keeps one
+
+            Query: limit, cursor (nextCursor of the previous page), since and
+            until (ISO timestamps), model, session.
+            """
+            args = request.args
+            try:
+                filters = {
+                    'limit': int(args.get('limit', 20)),
+                    'cursor': args.get('cursor'),
+                    'since': datetime.fromisoformat(args['since']).timestamp() if args.get('since') else None,
+                    'until': datetime.fromisoformat(args['until']).timestamp() if args.get('until') else None,
+                    'model': args.get('model'),
+                    'session': args.get('session')
+                }
+                history = await self.memory.history(**filters)
+            except ValueError:
+                return jsonify({'error': 'Invalid limit, cursor, since or until parameter'}), 400
+
+            result = {'memory': self.memory.load()}
+            if history is not None:
+                result['history'] = history
+            if filters['session']:
+                result['session'] = self.sessions.describe(filters['session'])
+            return jsonify(result)
+
+        @routes.route('/session/<session_id>', methods=['DELETE'])
+        async def end_session(session_id):
+            """Forget a session's window and summary"""
+            if not self.sessions.drop(session_id):
+                return jsonify({'error': 'Unknown session'}), 404
+            return jsonify({'session': session_id, 'ended': True})
+
+        @routes.route('/health', methods=['GET'])
+        async def health():
+            """Health check endpoint"""
+            return jsonify(self.health())
+
+        @routes.route('/models', methods=['GET'])
+        async def models():
+            """List available models"""
+            return jsonify({'models': list(self.models), 'default': self.default_model})
+
+        return routes
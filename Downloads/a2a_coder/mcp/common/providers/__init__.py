@@ -0,0 +1,3 @@
+"""
+Built-in gateway providers, imported lazily so each server only needs its own SDKs
+"""
@@ -0,0 +1,181 @@
+"""
+DeepSeek provider
+"""
+
+import json
+import os
+
+import httpx
+
+from common.hedging import HedgedCaller
+from common.provider import Provider
+
+class UpstreamError(Exception):
+    """Raised when the DeepSeek API answers with a non-200 status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class DeepSeekProvider(Provider):
+    """Chat completions over the shared httpx pool"""
+
+    name = 'deepseek'
+    service = 'deepseek-mcp'
+    prefix = 'DEEPSEEK'
+    models = ('deepseek-coder', 'deepseek-chat')
+    default_model = 'deepseek-coder'
+
+    def __init__(self, memory_path):
+        super().__init__(memory_path)
+        self.api_key = os.getenv('DEEPSEEK_API_KEY')
+        self.api_base = os.getenv('DEEPSEEK_API_BASE', 'https://api.deepseek.com')
+        self.headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+        self.client = None
+
+        # Upstream connection pool tuning
+        self.pool_size = int(os.getenv('DEEPSEEK_POOL_SIZE', 100))
+        self.keepalive_connections = int(os.getenv('DEEPSEEK_KEEPALIVE_CONNECTIONS', 20))
+        self.keepalive_expiry = float(os.getenv('DEEPSEEK_KEEPALIVE_EXPIRY', 60))
+        self.http2 = os.getenv('DEEPSEEK_HTTP2', 'false').lower() == 'true'
+        self.timeout = float(os.getenv('DEEPSEEK_TIMEOUT', 30))
+        self.warm_connections = int(os.getenv('DEEPSEEK_WARM_CONNECTIONS', 2))
+        self.max_inflight = int(os.getenv('DEEPSEEK_MAX_INFLIGHT', self.pool_size))
+
+        # Retries with jittered exponential backoff, and optional hedging at the observed latency quantile
+        self.retry_statuses = {int(code) for code in os.getenv('DEEPSEEK_RETRY_STATUSES', '500,502,503,504').split(',') if code}
+        self.upstream = HedgedCaller(
+            retries=int(os.getenv('DEEPSEEK_RETRIES', 2)),
+            backoff_base=float(os.getenv('DEEPSEEK_RETRY_BACKOFF', 0.2)),
+            backoff_max=float(os.getenv('DEEPSEEK_RETRY_BACKOFF_MAX', 5)),
+            hedge=os.getenv('DEEPSEEK_HEDGE', 'false').lower() == 'true',
+            hedge_quantile=float(os.getenv('DEEPSEEK_HEDGE_QUANTILE', 0.95)),
+            hedge_min_samples=int(os.getenv('DEEPSEEK_HEDGE_MIN_SAMPLES', 20))
+        )
+
+    def register_pools(self, pools):
+        pools.register(
+            self.api_base,
+            max_connections=self.pool_size,
+            keepalive_connections=self.keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+            http2=self.http2,
+            timeout=self.timeout,
+            warm_url=f'{self.api_base}/models',
+            warm_headers=self.headers,
+            warm_connections=self.warm_connections if self.api_key else 0
+        )
+
+    async def start(self, pools):
+        self.client = pools.client(self.api_base)
+
+    def configuration_error(self):
+        return None if self.api_key else 'DeepSeek API key not configured'
+
+    def build_payload(self, prompt, model, max_tokens=512, temperature=0.7, history=()):
+        """Build the chat/completions request body for a prompt and any session history"""
+        return {
+            'model': model,
+            'messages': [
+                *history,
+                {'role': 'user', 'content': prompt}
+            ],
+            'max_tokens': max_tokens,
+            'temperature': temperature
+        }
+
+    async def post_completion(self, payload):
+        """Make a single chat/completions attempt"""
+        response = await self.client.post(f'{self.api_base}/chat/completions', json=payload, headers=self.headers)
+
+        if response.status_code != 200:
+            raise UpstreamError(response.status_code, f"DeepSeek API error: {response.status_code} - {response.text}")
+
+        return response.json()
+
+    def is_retryable(self, error):
+        """Network failures and configured 5xx statuses are worth another attempt"""
+        if isinstance(error, UpstreamError):
+            return error.status in self.retry_statuses
+        return isinstance(error, httpx.TransportError)
+
+    async def create_completion(self, prompt, model, max_tokens, temperature, history=()):
+        payload = self.build_payload(prompt, model, max_tokens, temperature, history)
+        result = await self.upstream.call(model, lambda: self.post_completion(payload), self.is_retryable)
+
+        reply = result['choices'][0]['message']['content'] if result.get('choices') else '[No response]'
+        return reply, result.get('usage') or {}
+
+    async def open_stream(self, prompt, model, max_tokens, temperature, history=()):
+        payload = {
+            **self.build_payload(prompt, model, max_tokens, temperature, history),
+            'stream': True,
+            'stream_options': {'include_usage': True}
+        }
+        request = self.client.build_request('POST', f'{self.api_base}/chat/completions', json=payload, headers=self.headers)
+        response = await self.client.send(request, stream=True)
+
+        if response.status_code != 200:
+            body = (await response.aread()).decode(errors='replace')
+            await response.aclose()
+            raise UpstreamError(response.status_code, f"DeepSeek API error: {response.status_code} - {body}")
+
+        return self.relay(response)
+
+    async def relay(self, response):
+        """Parse upstream SSE lines into delta and usage chunks"""
+        try:
+            async for line in response.aiter_lines():
+                # Skip blank separators and ': keep-alive' comments
+                if not line.startswith('data:'):
+                    continue
+                frame = line[5:].strip()
+                if frame == '[DONE]':
+                    break
+
+                chunk = json.loads(frame)
+                if chunk.get('usage'):
+                    yield {'usage': chunk['usage']}
+                choices = chunk.get('choices') or []
+                delta = choices[0].get('delta', {}).get('content') if choices else None
+                if delta:
+                    yield {'delta': delta}
+        finally:
+            await response.aclose()
+
+    def is_throttled(self, error):
+        return isinstance(error, UpstreamError) and error.status == 429
+
+    def is_upstream_failure(self, error):
+        # Network failures and 5xx responses count against the circuit breaker
+        if isinstance(error, UpstreamError):
+            return error.status >= 500
+        return isinstance(error, httpx.TransportError)
+
+    def token_counts(self, usage):
+        return usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0), usage.get('total_tokens', 0)
+
+    def describe_error(self, error):
+        if isinstance(error, UpstreamError):
+            return str(error)
+        if isinstance(error, httpx.HTTPError):
+            return f"Network error: {str(error)}"
+        error_msg = f"Unexpected error: {str(error)}"
+        print(f"DeepSeek MCP Error: {error_msg}")
+        return error_msg
+
+    def health_extras(self):
+        return {
+            'api_configured': bool(self.api_key),
+            'pool': {
+                'maxConnections': self.pool_size,
+                'keepaliveConnections': self.keepalive_connections,
+                'http2': self.http2
+            }
+        }
+
+    def scheduler_extras(self):
+        return {'upstream': self.upstream.snapshot()}
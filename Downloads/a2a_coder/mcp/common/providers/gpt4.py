@@ -0,0 +1,136 @@
+"""
+OpenAI GPT-4 provider
+"""
+
+import os
+
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, RateLimitError
+
+from common.provider import Provider
+from common.semantic import SemanticCache, hashing_embedding
+
+def usage_summary(usage):
+    """Convert an OpenAI usage object to the camelCase shape kept in memory"""
+    return {
+        'promptTokens': usage.prompt_tokens if usage else 0,
+        'completionTokens': usage.completion_tokens if usage else 0,
+        'totalTokens': usage.total_tokens if usage else 0
+    }
+
+class GPT4Provider(Provider):
+    """Chat completions through the OpenAI SDK"""
+
+    name = 'gpt4'
+    service = 'gpt4-mcp'
+    prefix = 'GPT4'
+    models = ('gpt-4', 'gpt-4-turbo-preview', 'gpt-3.5-turbo')
+    default_model = 'gpt-4'
+
+    def __init__(self, memory_path):
+        super().__init__(memory_path)
+        self.api_key = os.getenv('OPENAI_API_KEY')
+        self.api_base = os.getenv('OPENAI_BASE_URL') or 'https://api.openai.com/v1'
+        # The SDK's own default; the shared pool would otherwise cut long completions off at 30s
+        self.timeout = float(os.getenv('GPT4_TIMEOUT', 600))
+        self.client = None
+
+        # Opt-in near-duplicate prompt cache; 'hashing' stays local, 'openai' embeds upstream
+        self.semantic_embedder = os.getenv('GPT4_SEMANTIC_EMBEDDER', 'hashing')
+        self.semantic_embedding_model = os.getenv('GPT4_SEMANTIC_EMBEDDING_MODEL', 'text-embedding-3-small')
+        if os.getenv('GPT4_SEMANTIC_CACHE', 'false').lower() == 'true':
+            self.semantic_cache = SemanticCache(
+                self.embed_prompt,
+                threshold=float(os.getenv('GPT4_SEMANTIC_THRESHOLD', 0.95)),
+                max_entries=int(os.getenv('GPT4_SEMANTIC_MAX_ENTRIES', 5000)),
+                embedding_cache_size=int(os.getenv('GPT4_SEMANTIC_EMBEDDING_CACHE', 2048))
+            )
+
+    def register_pools(self, pools):
+        pools.register(self.api_base, max_connections=self.max_inflight, timeout=self.timeout)
+
+    async def start(self, pools):
+        # The SDK rides on the shared pool, which the gateway closes on shutdown
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.api_base,
+            timeout=self.timeout,
+            http_client=pools.client(self.api_base)
+        )
+
+    async def embed_prompt(self, prompt):
+        """Embed a prompt for the semantic cache
+
+        Upstream embeddings share the in-flight cap with completions and
+        have a circuit breaker of their own, keyed by the embedding model.
+        """
+        if self.semantic_embedder == 'hashing':
+            return hashing_embedding(prompt)
+        async with self.inflight:
+            response = await self.breakers.call(
+                self.semantic_embedding_model,
+                lambda: self.client.embeddings.create(model=self.semantic_embedding_model, input=prompt),
+                self.is_upstream_failure
+            )
+        return response.data[0].embedding
+
+    async def create_completion(self, prompt, model, max_tokens, temperature, history=()):
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=[
+                *history,
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+
+        reply = response.choices[0].message.content if response.choices else '[No response]'
+        return reply, usage_summary(response.usage)
+
+    async def open_stream(self, prompt, model, max_tokens, temperature, history=()):
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=[
+                *history,
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={'include_usage': True}
+        )
+        return self.relay(stream)
+
+    async def relay(self, stream):
+        """Map SDK chunks to delta and usage chunks"""
+        try:
+            async for chunk in stream:
+                # The final chunk carries usage and no choices
+                if chunk.usage:
+                    yield {'usage': usage_summary(chunk.usage)}
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield {'delta': chunk.choices[0].delta.content}
+        finally:
+            await stream.close()
+
+    def is_throttled(self, error):
+        return isinstance(error, RateLimitError)
+
+    def is_upstream_failure(self, error):
+        # Connection errors and 5xx responses count against the circuit breaker
+        if isinstance(error, APIConnectionError):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code >= 500
+
+    def token_counts(self, usage):
+        return usage.get('promptTokens', 0), usage.get('completionTokens', 0), usage.get('totalTokens', 0)
+
+    def describe_error(self, error):
+        print(f"GPT-4 MCP Error: {error}")
+        return str(error)
+
+    def health_extras(self):
+        return {'maxInflight': self.max_inflight}
+
+    def cache_extras(self):
+        return {'semantic': self.semantic_cache.snapshot() if self.semantic_cache else {'enabled': False}}
@@ -0,0 +1,264 @@
+"""
+Per-model upstream scheduler
+
+Each model gets token buckets for requests/min and tokens/min plus an
+adaptive concurrency limit. The limit grows additively while calls
+succeed and is cut multiplicatively on a 429 or when latency exceeds
+its target (AIMD). Requests that can't be admitted wait in FIFO order
+rather than failing.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+class TokenBucket:
+    """Refills continuously up to one minute's worth of capacity"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def delay(self, amount):
+        """Seconds until amount can be taken; 0 when it can be taken now"""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        """Debit amount; negative amounts refund unused estimates"""
+        if self.capacity <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - min(amount, self.capacity))
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+class ModelScheduler:
+    """Admission control for one model"""
+
+    def __init__(self, rpm=0, tpm=0, concurrency=16, min_concurrency=1, max_concurrency=64,
+                 latency_target_ms=0, decrease_factor=0.5, recent_waits=512):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limit = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target_ms = latency_target_ms
+        self.decrease_factor = decrease_factor
+        self.inflight = 0
+        self.queued = 0
+        self.gate = asyncio.Lock()
+        self.released = asyncio.Event()
+        self.waits = deque(maxlen=recent_waits)
+        self.stats = {
+            'admitted': 0,
+            'throttled': 0,
+            'slow': 0,
+            'waitMsTotal': 0.0,
+            'waitMsMax': 0.0
+        }
+
+    async def acquire(self, estimated_tokens):
+        """Wait in line until concurrency and both buckets admit the call"""
+        enqueued = time.monotonic()
+        self.queued += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, so the head of the line is admitted first
+            async with self.gate:
+                while True:
+                    if self.inflight < int(self.limit):
+                        delay = max(self.requests.delay(1), self.tokens.delay(estimated_tokens))
+                        if delay == 0:
+                            break
+                        await asyncio.sleep(delay)
+                    else:
+                        self.released.clear()
+                        await self.released.wait()
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+                self.inflight += 1
+        finally:
+            self.queued -= 1
+
+        wait_ms = (time.monotonic() - enqueued) * 1000
+        self.waits.append(wait_ms)
+        self.stats['admitted'] += 1
+        self.stats['waitMsTotal'] += wait_ms
+        self.stats['waitMsMax'] = max(self.stats['waitMsMax'], wait_ms)
+
+    def release(self, latency_ms=None, throttled=False, failed=False, token_correction=0):
+        """Free the slot and adapt the concurrency limit from the outcome"""
+        self.inflight -= 1
+        self.tokens.take(token_correction)
+
+        if failed and not throttled:
+            # Other errors say nothing about upstream capacity
+            pass
+        elif throttled:
+            self.stats['throttled'] += 1
+            self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+        elif latency_ms is not None and self.latency_target_ms and latency_ms > self.latency_target_ms:
+            self.stats['slow'] += 1
+            self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+        else:
+            # Roughly +1 per window of successful calls
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+
+        self.released.set()
+
+    def snapshot(self):
+        """Queue depth, wait times and the current limit"""
+        waits = sorted(self.waits)
+        admitted = self.stats['admitted']
+        return {
+            'concurrencyLimit': round(self.limit, 2),
+            'inflight': self.inflight,
+            'queueDepth': self.queued,
+            'admitted': admitted,
+            'throttled': self.stats['throttled'],
+            'slow': self.stats['slow'],
+            'waitMsAvg': self.stats['waitMsTotal'] / admitted if admitted else 0.0,
+            'waitMsP95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+            'waitMsMax': self.stats['waitMsMax'],
+            'requestTokensAvailable': round(self.requests.tokens, 1) if self.requests.capacity else None,
+            'tokenBudgetAvailable': round(self.tokens.tokens, 1) if self.tokens.capacity else None
+        }
+
+def limits_from_env(prefix, max_inflight=256):
+    """Default per-model limits and per-model overrides from <PREFIX>_* variables
+
+    The concurrency limit starts at, and is capped by, the provider's own
+    in-flight cap unless set explicitly, so it only tightens after a 429
+    or a slow call. <PREFIX>_MODEL_LIMITS takes a JSON object of per-model
+    overrides, e.g. {"gpt-4": {"rpm": 500, "tpm": 30000}}.
+    """
+    defaults = {
+        'rpm': int(os.getenv(f'{prefix}_RPM', 0)),
+        'tpm': int(os.getenv(f'{prefix}_TPM', 0)),
+        'concurrency': int(os.getenv(f'{prefix}_CONCURRENCY_INITIAL', max_inflight)),
+        'min_concurrency': int(os.getenv(f'{prefix}_CONCURRENCY_MIN', 1)),
+        'max_concurrency': int(os.getenv(f'{prefix}_CONCURRENCY_MAX', max_inflight)),
+        'latency_target_ms': float(os.getenv(f'{prefix}_LATENCY_TARGET_MS', 0))
+    }
+    return defaults, json.loads(os.getenv(f'{prefix}_MODEL_LIMITS', '{}'))
+
+class Scheduler:
+    """Creates a ModelScheduler per (profile, model) on first use
+
+    Providers sharing one scheduler register a profile with their own
+    default limits; models they schedule are created from that profile.
+    Schedulers are keyed by profile too, so two providers that serve a
+    model of the same name keep separate limits. Clients name the model,
+    so at most max_models are kept; the least recently used idle ones go.
+    """
+
+    def __init__(self, defaults, overrides=None, max_requeues=2, requeue_backoff=0.5, max_models=256):
+        self.defaults = defaults
+        self.overrides = overrides or {}
+        self.max_requeues = max_requeues
+        self.requeue_backoff = requeue_backoff
+        self.max_models = max_models
+        self.profiles = {}
+        self.models = OrderedDict()
+
+    @classmethod
+    def from_env(cls, prefix):
+        """Build a scheduler from <PREFIX>_* environment variables"""
+        defaults, overrides = limits_from_env(prefix)
+        return cls(
+            defaults,
+            overrides,
+            max_requeues=int(os.getenv(f'{prefix}_REQUEUE_ON_429', 2)),
+            requeue_backoff=float(os.getenv(f'{prefix}_REQUEUE_BACKOFF', 0.5)),
+            max_models=int(os.getenv(f'{prefix}_SCHEDULER_MAX_MODELS', 256))
+        )
+
+    def add_profile(self, name, defaults, overrides=None):
+        """Register default limits for the models of one provider"""
+        self.profiles[name] = (defaults, overrides or {})
+
+    def for_model(self, model, profile=None):
+        """Return the model's scheduler, creating it on first use"""
+        key = (profile, model)
+        if key not in self.models:
+            defaults, overrides = self.profiles.get(profile, (self.defaults, self.overrides))
+            self.models[key] = ModelScheduler(**{**defaults, **overrides.get(model, {})})
+            self._evict()
+        self.models.move_to_end(key)
+        return self.models[key]
+
+    def _evict(self):
+        """Drop least recently used schedulers over max_models; busy ones are kept so limits hold"""
+        excess = len(self.models) - self.max_models
+        for key in [key for key, scheduler in self.models.items() if not scheduler.inflight and not scheduler.queued]:
+            if excess <= 0:
+                break
+            del self.models[key]
+            excess -= 1
+
+    @asynccontextmanager
+    async def slot(self, model, estimated_tokens, profile=None):
+        """Hold an admission slot; the body reports its outcome via the yielded dict
+
+        The body may set 'throttled', 'failed', 'latencyMs' (omit for
+        streams) and 'tokens' (actual total tokens) before the slot is released.
+        """
+        scheduler = self.for_model(model, profile)
+        await scheduler.acquire(estimated_tokens)
+        outcome = {'throttled': False, 'failed': False, 'latencyMs': None, 'tokens': estimated_tokens}
+        try:
+            yield outcome
+        except BaseException:
+            outcome['failed'] = True
+            raise
+        finally:
+            scheduler.release(
+                outcome['latencyMs'],
+                outcome['throttled'],
+                outcome['failed'],
+                outcome['tokens'] - estimated_tokens
+            )
+
+    async def run(self, model, estimated_tokens, fn, is_throttled, count_tokens, profile=None):
+        """Run fn() under the model's limits, re-queueing it after provider 429s"""
+        for attempt in range(self.max_requeues + 1):
+            async with self.slot(model, estimated_tokens, profile) as outcome:
+                started = time.monotonic()
+                try:
+                    result = await fn()
+                except Exception as e:
+                    outcome['throttled'] = is_throttled(e)
+                    if not outcome['throttled'] or attempt == self.max_requeues:
+                        raise
+                else:
+                    outcome['latencyMs'] = (time.monotonic() - started) * 1000
+                    outcome['tokens'] = count_tokens(result) or estimated_tokens
+                    return result
+            # Back off outside the slot so queued requests can use it meanwhile
+            await asyncio.sleep(self.requeue_backoff * 2 ** attempt)
+
+    def snapshot(self, profile=None):
+        """Per-model scheduler state, optionally only one profile's models
+
+        Without a profile, models are listed as 'profile:model'.
+        """
+        return {
+            model if profile is not None else f'{owner}:{model}': scheduler.snapshot()
+            for (owner, model), scheduler in self.models.items()
+            if profile is None or owner == profile
+        }
+
+def estimate_tokens(prompt, max_tokens):
+    """Rough tokens/min cost of a request before the provider reports usage"""
+    return len(prompt) // 4 + int(max_tokens)
@@ -0,0 +1,129 @@
+"""
+Semantic (near-duplicate) prompt cache
+
+Prompts are embedded and kept in a fixed-size NumPy matrix of unit
+vectors; a lookup is one matrix-vector product. Entries only match
+within the same scope (model and sampling parameters), and the least
+recently used row is overwritten once the index is full.
+"""
+
+import hashlib
+import time
+import zlib
+from collections import OrderedDict, deque
+
+import numpy as np
+
+def hashing_embedding(text, dim=512):
+    """Embed text locally as hashed character trigram counts"""
+    vector = np.zeros(dim, dtype=np.float32)
+    normalized = ' '.join(text.lower().split())
+    for i in range(max(len(normalized) - 2, 1)):
+        vector[zlib.crc32(normalized[i:i + 3].encode()) % dim] += 1.0
+    return vector
+
+class SemanticCache:
+    """In-process similarity index over earlier prompts and their replies"""
+
+    def __init__(self, embed, threshold=0.95, max_entries=5000, embedding_cache_size=2048, recent_hits=50):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.embedding_cache_size = embedding_cache_size
+        self.embeddings = OrderedDict()
+        self.vectors = None
+        self.scopes = np.zeros(max_entries, dtype=np.int64)
+        self.last_used = np.zeros(max_entries, dtype=np.float64)
+        self.entries = [None] * max_entries
+        self.size = 0
+        self.recent = deque(maxlen=recent_hits)
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'embeddings': 0,
+            'embeddingCacheHits': 0
+        }
+
+    async def lookup(self, prompt, scope):
+        """Return (entry, similarity) for the closest earlier prompt, or (None, best)"""
+        vector = await self._vector(prompt)
+        if self.size == 0:
+            self.stats['misses'] += 1
+            return None, 0.0
+
+        similarities = self.vectors[:self.size] @ vector
+        similarities[self.scopes[:self.size] != self._scope_id(scope)] = -1.0
+        row = int(np.argmax(similarities))
+        similarity = float(similarities[row])
+
+        if similarity < self.threshold:
+            self.stats['misses'] += 1
+            return None, max(similarity, 0.0)
+
+        self.last_used[row] = time.time()
+        entry = self.entries[row]
+        self.stats['hits'] += 1
+        self.recent.append({
+            'prompt': prompt[:120],
+            'matchedPrompt': entry['prompt'][:120],
+            'similarity': round(similarity, 4),
+            'timestamp': time.time()
+        })
+        return entry, similarity
+
+    async def add(self, prompt, scope, reply, usage):
+        """Index a fresh upstream reply under its prompt embedding"""
+        vector = await self._vector(prompt)
+        if self.vectors is None:
+            self.vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+        if self.size < self.max_entries:
+            row = self.size
+            self.size += 1
+        else:
+            row = int(np.argmin(self.last_used))
+            self.stats['evictions'] += 1
+
+        self.vectors[row] = vector
+        self.scopes[row] = self._scope_id(scope)
+        self.last_used[row] = time.time()
+        self.entries[row] = {'prompt': prompt, 'reply': reply, 'usage': usage}
+        self.stats['stores'] += 1
+
+    def snapshot(self):
+        """Counters, index occupancy and recent hit similarities"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'threshold': self.threshold,
+            'hitRatio': self.stats['hits'] / lookups if lookups else 0.0,
+            'indexSize': self.size,
+            'maxEntries': self.max_entries,
+            'embeddingCacheSize': len(self.embeddings),
+            'recentHits': list(self.recent)
+        }
+
+    async def _vector(self, prompt):
+        key = hashlib.sha256(prompt.strip().encode()).hexdigest()
+        vector = self.embeddings.get(key)
+        if vector is not None:
+            self.embeddings.move_to_end(key)
+            self.stats['embeddingCacheHits'] += 1
+            return vector
+
+        vector = np.asarray(await self.embed(prompt), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        self.stats['embeddings'] += 1
+
+        self.embeddings[key] = vector
+        while len(self.embeddings) > self.embedding_cache_size:
+            self.embeddings.popitem(last=False)
+        return vector
+
+    @staticmethod
+    def _scope_id(scope):
+        return int.from_bytes(hashlib.blake2b(scope.encode(), digest_size=8).digest(), 'big', signed=True)
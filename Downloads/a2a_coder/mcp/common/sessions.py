@@ -0,0 +1,228 @@
+"""
+Conversation sessions
+
+A session_id keeps that conversation's turns in process. Each request
+sends the newest turns that fit a token budget; older turns fall out of
+the window and can be folded into a rolling summary sent as a system
+message. Sessions idle past a TTL are dropped, and least recently used
+sessions go first once the store holds too many sessions or tokens.
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+MAX_SESSION_ID = 128
+
+def count_tokens(text):
+    """Rough token count, the same four-characters-per-token rule the scheduler uses"""
+    return len(text) // 4 + 1
+
+def first_sentence(text, limit=200):
+    sentence = re.split(r'(?<=[.!?])\s', text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rstrip() + '...'
+
+class Session:
+    """One conversation's window of turns and its rolling summary"""
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.turns = deque()
+        self.tokens = 0
+        self.summary = ''
+        self.evicted = 0
+        # Evicted turns waiting for the session's one summary task
+        self.unsummarized = []
+        self.summarizer = None
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def context(self):
+        """Messages to send ahead of the next prompt"""
+        messages = []
+        if self.summary:
+            messages.append({'role': 'system', 'content': f'Summary of the earlier conversation: {self.summary}'})
+        messages.extend({'role': role, 'content': content} for role, content, _ in self.turns)
+        return messages
+
+    def describe(self):
+        return {
+            'id': self.id,
+            'turns': len(self.turns),
+            'tokens': self.tokens,
+            'evictedTurns': self.evicted,
+            'summarized': bool(self.summary)
+        }
+
+class SessionStore:
+    """Per-session history with token-budgeted windows and idle eviction
+
+    summary is 'off' (evicted turns are dropped), 'extractive' (keep the
+    first sentence of each evicted turn) or 'model' (ask summarize(prompt,
+    model, max_tokens) to fold them into the summary in the background).
+    """
+
+    def __init__(self, summarize=None, history_tokens=2000, summary='off', summary_tokens=256, summary_model=None,
+                 idle_seconds=1800, max_sessions=10000, max_tokens=5000000):
+        self.summarize = summarize
+        self.history_tokens = history_tokens
+        self.summary = summary
+        self.summary_tokens = summary_tokens
+        self.summary_model = summary_model
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.max_tokens = max_tokens
+        self.sessions = OrderedDict()
+        self.total_tokens = 0
+        self.summarizing = set()
+        self.stats = {
+            'created': 0,
+            'turns': 0,
+            'evictedTurns': 0,
+            'summaries': 0,
+            'summaryErrors': 0,
+            'idleEvictions': 0,
+            'pressureEvictions': 0
+        }
+
+    @classmethod
+    def from_env(cls, prefix, summarize, default_model):
+        """Build from <PREFIX>_SESSION_* settings"""
+        return cls(
+            summarize,
+            history_tokens=int(os.getenv(f'{prefix}_SESSION_HISTORY_TOKENS', 2000)),
+            summary=os.getenv(f'{prefix}_SESSION_SUMMARY', 'off').lower(),
+            summary_tokens=int(os.getenv(f'{prefix}_SESSION_SUMMARY_TOKENS', 256)),
+            summary_model=os.getenv(f'{prefix}_SESSION_SUMMARY_MODEL') or default_model,
+            idle_seconds=float(os.getenv(f'{prefix}_SESSION_IDLE_SECONDS', 1800)),
+            max_sessions=int(os.getenv(f'{prefix}_SESSION_MAX_SESSIONS', 10000)),
+            max_tokens=int(os.getenv(f'{prefix}_SESSION_MAX_TOKENS', 5000000))
+        )
+
+    @staticmethod
+    def valid_id(session_id):
+        return session_id is None or (isinstance(session_id, str) and 0 < len(session_id) <= MAX_SESSION_ID)
+
+    @asynccontextmanager
+    async def turn(self, session_id):
+        """Hold a session for one request so its turns stay in order; yields None without a session_id"""
+        if session_id is None:
+            yield None
+            return
+
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = Session(session_id)
+            self.stats['created'] += 1
+        self.sessions.move_to_end(session_id)
+
+        async with session.lock:
+            session.last_used = time.monotonic()
+            yield session
+            session.last_used = time.monotonic()
+        self.trim()
+
+    def add(self, session, prompt, reply):
+        """Append an exchange and slide the window back under the token budget"""
+        for role, content in (('user', prompt), ('assistant', reply)):
+            tokens = count_tokens(content)
+            session.turns.append((role, content, tokens))
+            session.tokens += tokens
+            self.total_tokens += tokens
+        self.stats['turns'] += 1
+
+        # Evict whole exchanges so the window never opens on an assistant turn
+        evicted = []
+        while session.tokens > self.history_tokens and session.turns:
+            for _ in range(2):
+                role, content, tokens = session.turns.popleft()
+                session.tokens -= tokens
+                self.total_tokens -= tokens
+                evicted.append((role, content))
+        if evicted:
+            session.evicted += len(evicted)
+            self.stats['evictedTurns'] += len(evicted)
+            self.fold(session, evicted)
+
+    def fold(self, session, evicted):
+        """Fold turns that left the window into the session's summary"""
+        if self.summary == 'extractive':
+            lines = [f'{role}: {first_sentence(content)}' for role, content in evicted]
+            summary = ' '.join(filter(None, [session.summary, *lines]))
+            # Keep the most recent part that fits the summary budget
+            self.set_summary(session, summary[-self.summary_tokens * 4:])
+        elif self.summary == 'model' and self.summarize:
+            # One summary at a time per session; later evictions wait and are folded in by the same task
+            session.unsummarized.extend(evicted)
+            if session.summarizer is None:
+                session.summarizer = asyncio.create_task(self.summarize_pending(session))
+                self.summarizing.add(session.summarizer)
+                session.summarizer.add_done_callback(self.summarizing.discard)
+
+    async def summarize_pending(self, session):
+        try:
+            while session.unsummarized and self.sessions.get(session.id) is session:
+                evicted, session.unsummarized = session.unsummarized, []
+                await self.summarize_turns(session, evicted)
+        finally:
+            session.summarizer = None
+
+    async def summarize_turns(self, session, evicted):
+        transcript = '\n'.join(f'{role}: {content}' for role, content in evicted)
+        prompt = (
+            'Update the running summary of a conversation with the turns below. '
+            'Keep names, decisions and open questions; answer with the summary only.\n\n'
+            f'Current summary: {session.summary or "(none)"}\n\nTurns:\n{transcript}'
+        )
+        try:
+            summary = await self.summarize(prompt, self.summary_model, self.summary_tokens)
+        except Exception as e:
+            self.stats['summaryErrors'] += 1
+            print(f"Session summary failed: {e}")
+            return
+        if self.sessions.get(session.id) is session:
+            self.set_summary(session, summary.strip())
+            self.stats['summaries'] += 1
+
+    def set_summary(self, session, summary):
+        self.total_tokens += count_tokens(summary) - (count_tokens(session.summary) if session.summary else 0)
+        session.summary = summary
+
+    def trim(self):
+        """Drop idle sessions, then least recently used ones while over the session or token cap"""
+        now = time.monotonic()
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            idle = now - session.last_used > self.idle_seconds
+            pressure = len(self.sessions) > self.max_sessions or self.total_tokens > self.max_tokens
+            if not (idle or pressure) or session.lock.locked():
+                break
+            self.drop(session_id)
+            self.stats['idleEvictions' if idle else 'pressureEvictions'] += 1
+
+    def drop(self, session_id):
+        """Forget a session; returns whether it existed"""
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self.total_tokens -= session.tokens + (count_tokens(session.summary) if session.summary else 0)
+        return True
+
+    def describe(self, session_id):
+        """A session's window and summary, or None"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        return {**session.describe(), 'summary': session.summary, 'messages': session.context()}
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            'sessions': len(self.sessions),
+            'tokens': self.total_tokens,
+            'historyTokens': self.history_tokens,
+            'summary': self.summary
+        }
@@ -0,0 +1,44 @@
+"""
+Single-flight coalescing of identical concurrent upstream calls
+
+The first caller for a key starts the call as its own task; callers that
+arrive while it is running await the same task. The task is shielded so
+a disconnecting caller never cancels the call for everyone else, and its
+result or exception is delivered to every waiter.
+"""
+
+import asyncio
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key"""
+
+    def __init__(self):
+        self.calls = {}
+        self.stats = {
+            'leaders': 0,
+            'coalesced': 0,
+            'failures': 0
+        }
+
+    async def do(self, key, fn):
+        """Await fn() once per key across all concurrent callers"""
+        task = self.calls.get(key)
+        if task:
+            self.stats['coalesced'] += 1
+        else:
+            self.stats['leaders'] += 1
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def snapshot(self):
+        """Counters plus the number of calls currently in flight"""
+        return {**self.stats, 'inflight': len(self.calls)}
+
+    def _finish(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # Mark the exception retrieved even if every waiter has gone away
+        if not task.cancelled() and task.exception() is not None:
+            self.stats['failures'] += 1
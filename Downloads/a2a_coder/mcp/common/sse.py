@@ -0,0 +1,20 @@
+"""
+Response helpers shared by the provider routes
+"""
+
+import json
+
+from quart import jsonify
+
+def sse_event(payload, event=None):
+    """Format a payload as a server-sent event frame"""
+    frame = f"event: {event}\n" if event else ''
+    return f"{frame}data: {json.dumps(payload)}\n\n"
+
+def circuit_open_response(error):
+    """503 with a distinct error code so callers can route elsewhere"""
+    return jsonify({
+        'error': str(error),
+        'code': 'circuit_open',
+        'retryAfter': round(error.retry_after, 1)
+    }), 503, {'Retry-After': str(max(1, round(error.retry_after)))}
@@ -0,0 +1,223 @@
+"""
+Span-level request tracing for the provider servers
+
+Every request gets a trace id, taken from an incoming W3C `traceparent`
+or `X-Trace-Id` header when present, and returned in both headers so the
+orchestrator can join its traces with ours. Sampled requests record a
+root span plus child spans for each phase (memory load, upstream call,
+memory save) and export them as JSON lines to stdout or a file.
+Background work outside a request, such as memory flushes, gets a trace
+of its own that links back to the requests it serves.
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+TRACE_ID = re.compile(r'^[0-9A-Za-z-]{1,64}$')
+
+# The innermost open span of the current task
+current_span = ContextVar('current_span', default=None)
+
+def new_id(bits):
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+class Span:
+    """One timed phase of a request"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'sampled', 'attributes', 'links', 'start', 'started', 'error')
+
+    def __init__(self, name, trace_id, parent_id=None, sampled=True, attributes=None, links=()):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_id(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes or {}
+        # (trace id, span id) of spans in other traces that caused this one
+        self.links = list(links)
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record(self, service):
+        """The exported JSON line for a finished span"""
+        return {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentId': self.parent_id,
+            'service': service,
+            'name': self.name,
+            'start': self.start,
+            'durationMs': round((time.perf_counter() - self.started) * 1000, 3),
+            'attributes': self.attributes,
+            'links': [{'traceId': trace_id, 'spanId': span_id} for trace_id, span_id in self.links],
+            'error': self.error
+        }
+
+class Tracer:
+    """Creates spans under the current request and exports the sampled ones"""
+
+    def __init__(self, service, exporter='none', path=None, sample_rate=1.0):
+        self.service = service
+        self.sample_rate = sample_rate
+        self.enabled = exporter in ('stdout', 'file')
+        self.out = None
+        if exporter == 'stdout':
+            self.out = sys.stdout
+        elif exporter == 'file':
+            # Line-buffered so spans land on disk as each one finishes
+            self.out = open(path, 'a', buffering=1)
+        self.stats = {
+            'traces': 0,
+            'sampled': 0,
+            'spans': 0
+        }
+
+    @classmethod
+    def from_env(cls, prefix, service, default_path):
+        """Build a tracer from <PREFIX>_TRACE_* environment variables"""
+        return cls(
+            service,
+            exporter=os.getenv(f'{prefix}_TRACE_EXPORTER', 'none').lower(),
+            path=os.getenv(f'{prefix}_TRACE_FILE') or default_path,
+            sample_rate=float(os.getenv(f'{prefix}_TRACE_SAMPLE_RATE', 1.0))
+        )
+
+    def install(self, app):
+        """Wrap the app's ASGI handler so every request runs inside a root span"""
+        app.asgi_app = TracingMiddleware(app.asgi_app, self)
+
+        @app.after_serving
+        async def close_exporter():
+            if self.out and self.out is not sys.stdout:
+                self.out.close()
+
+    def start_trace(self, headers):
+        """Root span for a request, continuing the caller's trace if it sent one"""
+        trace_id = parent_id = None
+        forced = False
+        match = TRACEPARENT.match(headers.get('traceparent', ''))
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            forced = bool(int(flags, 16) & 1)
+        elif TRACE_ID.match(headers.get('x-trace-id', '')):
+            trace_id = headers['x-trace-id']
+
+        # Calls the orchestrator sampled are always kept so its traces join up
+        sampled = self.enabled and (forced or random.random() < self.sample_rate)
+        self.stats['traces'] += 1
+        self.stats['sampled'] += sampled
+        return Span('request', trace_id or new_id(128), parent_id, sampled)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the body as a child of the current span; a no-op when unsampled"""
+        parent = current_span.get()
+        if parent is None or not parent.sampled:
+            yield None
+            return
+
+        with self.activate(Span(name, parent.trace_id, parent.span_id, True, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def root_span(self, name, links=(), **attributes):
+        """Time background work as a trace of its own, linked to the spans that caused it
+
+        Work linked to a sampled span is always kept; unlinked work is
+        sampled like a request.
+        """
+        links = [link for link in links if link]
+        sampled = self.enabled and (bool(links) or random.random() < self.sample_rate)
+        self.stats['traces'] += 1
+        self.stats['sampled'] += sampled
+        if not sampled:
+            yield None
+            return
+
+        with self.activate(Span(name, new_id(128), None, True, attributes, links)) as span:
+            yield span
+
+    def link(self):
+        """The current span as a link for later background work, or None when unsampled"""
+        span = current_span.get()
+        return (span.trace_id, span.span_id) if span is not None and span.sampled else None
+
+    @contextmanager
+    def activate(self, span):
+        """Make span current for the body, then export it"""
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            current_span.reset(token)
+            self.export(span)
+
+    def export(self, span):
+        self.stats['spans'] += 1
+        try:
+            self.out.write(json.dumps(span.record(self.service), default=str) + '\n')
+        except Exception as e:
+            print(f"[{self.service}] Trace export failed: {e}")
+
+    def snapshot(self):
+        """Exporter settings and counters"""
+        return {
+            **self.stats,
+            'enabled': self.enabled,
+            'sampleRate': self.sample_rate
+        }
+
+class TracingMiddleware:
+    """ASGI wrapper that opens the root span and returns the trace id headers
+
+    The span is closed after the last body chunk, so streamed replies are
+    traced end to end.
+    """
+
+    def __init__(self, app, tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        root = self.tracer.start_trace(headers)
+        root.set(method=scope['method'], path=scope['path'])
+        trace_headers = [(b'x-trace-id', root.trace_id.encode())]
+        if re.fullmatch(r'[0-9a-f]{32}', root.trace_id):
+            # Free-form X-Trace-Id values can't be carried in a W3C traceparent
+            flags = '01' if root.sampled else '00'
+            trace_headers.append((b'traceparent', f'00-{root.trace_id}-{root.span_id}-{flags}'.encode()))
+
+        async def send_with_trace(message):
+            if message['type'] == 'http.response.start':
+                root.set(status=message['status'])
+                message = {**message, 'headers': list(message.get('headers', [])) + trace_headers}
+            await send(message)
+
+        token = current_span.set(root)
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            current_span.reset(token)
+            if root.sampled:
+                self.tracer.export(root)
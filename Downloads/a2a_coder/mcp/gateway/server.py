@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+MCP Gateway for A2A System
+Hosts every Python provider in one process, sharing upstream pools,
+the response cache and the scheduler
+
+Existing clients keep their URLs: bind the gateway to both provider
+ports, e.g. `hypercorn server:app --bind 0.0.0.0:8000 --bind 0.0.0.0:8001`,
+or run `python server.py`, which binds GATEWAY_BIND.
+"""
+
+import asyncio
+import os
+import sys
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.gateway import create_app, load_provider
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MCP_DIR = os.path.dirname(BASE_DIR)
+
+# Comma-separated built-in names or 'module:Class' plugin paths
+GATEWAY_PROVIDERS = [name.strip() for name in os.getenv('GATEWAY_PROVIDERS', 'gpt4,deepseek').split(',') if name.strip()]
+GATEWAY_BIND = [bind.strip() for bind in os.getenv('GATEWAY_BIND', '0.0.0.0:8000,0.0.0.0:8001').split(',') if bind.strip()]
+
+def build_providers():
+    """Instantiate the configured providers, keeping each memory file in its provider's directory"""
+    providers = []
+    for name in GATEWAY_PROVIDERS:
+        provider_class = load_provider(name)
+        providers.append(provider_class(os.path.join(MCP_DIR, provider_class.name, 'memory.json')))
+    return providers
+
+app = create_app(build_providers(), 'GATEWAY', 'mcp-gateway', BASE_DIR)
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    
+    config = Config()
+    config.bind = GATEWAY_BIND
+    print(f"[MCP Gateway] Serving {', '.join(GATEWAY_PROVIDERS)} on {', '.join(GATEWAY_BIND)}")
+    asyncio.run(serve(app, config))
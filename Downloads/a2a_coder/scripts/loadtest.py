@@ -0,0 +1,311 @@
+# scripts/loadtest.py (Serving regression harness)
+"""
+Drives the completion endpoints and reports latency percentiles,
+throughput and error rate, saved as JSON for comparing runs.
+
+    # open loop: fixed arrival rate, latency measured from the intended send time
+    python scripts/loadtest.py gpt4 --mode open --rate 50 --duration 30 --out runs/gpt4.json
+
+    # closed loop: fixed concurrency, latency corrected for coordinated omission
+    python scripts/loadtest.py deepseek --mode closed --concurrency 32 --duration 30
+
+    # regression gate against an earlier run
+    python scripts/loadtest.py gpt4 --rate 50 --compare runs/gpt4.json --max-regression 0.1
+
+Targets: gpt4 and deepseek hit /mcp/<name>/completion, orchestrator hits
+/api/orchestrator/dispatch. Run them against scripts/mock_upstream.py so
+results reflect our serving path, not the provider's day.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+TARGETS = {
+    'gpt4': ('http://localhost:8000', '/mcp/gpt4/completion', 'gpt-4'),
+    'deepseek': ('http://localhost:8001', '/mcp/deepseek/completion', 'deepseek-coder'),
+    'orchestrator': ('http://localhost:3001', '/api/orchestrator/dispatch', None)
+}
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+class Histogram:
+    """Log-bucketed latency histogram (about 2% relative precision), in milliseconds"""
+
+    GROWTH = 1.02
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value, count=1):
+        value = max(value, 0.001)
+        index = math.ceil(math.log(value * 1000) / math.log(self.GROWTH))
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def record_corrected(self, value, interval):
+        """Record a sample plus the ones a stalled closed-loop client never sent
+
+        Same rule as HdrHistogram's recordValueWithExpectedInterval: a
+        response that took k expected intervals hid k-1 requests that
+        would have queued behind it.
+        """
+        self.record(value)
+        if interval <= 0:
+            return
+        missing = value - interval
+        while missing >= interval:
+            self.record(missing)
+            missing -= interval
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        target = math.ceil(self.count * p / 100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                return min(self.GROWTH ** index / 1000, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'minMs': round(self.min, 3) if self.count else 0.0,
+            'meanMs': round(self.total / self.count, 3) if self.count else 0.0,
+            'maxMs': round(self.max, 3),
+            'percentilesMs': {f'p{p:g}': round(self.percentile(p), 3) for p in PERCENTILES},
+            'buckets': [[round(self.GROWTH ** index / 1000, 3), self.buckets[index]] for index in sorted(self.buckets)]
+        }
+
+class Run:
+    """Samples and outcomes of one load run"""
+
+    def __init__(self):
+        self.samples = []
+        self.statuses = {}
+        self.errors = 0
+
+    def record(self, intended, started, finished, status):
+        # (latency from intended send, service time from actual send), ms
+        self.samples.append(((finished - intended) * 1000, (finished - started) * 1000))
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if not (isinstance(status, int) and 200 <= status < 300):
+            self.errors += 1
+
+def build_payload(args, seq):
+    prompt = args.prompt
+    if args.unique_prompts:
+        # Defeat the response cache so every request reaches the upstream
+        prompt = f'{prompt} #{seq}-{random.getrandbits(32)}'
+    _, _, model = TARGETS[args.target]
+    if args.target == 'orchestrator':
+        return {'prompt': prompt, 'modelHint': args.model} if args.model else {'prompt': prompt}
+    return {'prompt': prompt, 'model': args.model or model, 'max_tokens': args.max_tokens}
+
+async def send(client, args, url, seq, intended, run, measuring):
+    started = time.perf_counter()
+    try:
+        response = await client.post(url, json=build_payload(args, seq))
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    finished = time.perf_counter()
+    if measuring(intended):
+        run.record(intended, started, finished, status)
+
+async def open_loop(client, args, url, run, measuring, deadline):
+    """Launch requests on a fixed schedule regardless of how fast they complete"""
+    tasks = set()
+    seq = 0
+    gate = asyncio.Semaphore(args.max_outstanding)
+    next_at = time.perf_counter()
+
+    async def one(seq, intended):
+        # Waiting for a slot counts toward latency: the intended time is kept
+        async with gate:
+            await send(client, args, url, seq, intended, run, measuring)
+
+    while next_at < deadline:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(one(seq, next_at))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        seq += 1
+        next_at += random.expovariate(args.rate) if args.arrivals == 'poisson' else 1 / args.rate
+
+    if tasks:
+        await asyncio.gather(*tasks)
+
+async def closed_loop(client, args, url, run, measuring, deadline):
+    """Keep a fixed number of requests outstanding"""
+    counter = iter(range(sys.maxsize))
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            now = time.perf_counter()
+            await send(client, args, url, next(counter), now, run, measuring)
+            if args.think_ms:
+                await asyncio.sleep(args.think_ms / 1000)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+async def run_load(args):
+    base_url, path, _ = TARGETS[args.target]
+    url = f'{args.base_url or base_url}{path}'
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=args.max_outstanding)
+    run = Run()
+
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        measure_from = start + args.warmup
+        deadline = measure_from + args.duration
+
+        def measuring(intended):
+            return measure_from <= intended < deadline
+
+        if args.mode == 'open':
+            await open_loop(client, args, url, run, measuring, deadline)
+        else:
+            await closed_loop(client, args, url, run, measuring, deadline)
+        elapsed = time.perf_counter() - measure_from
+
+    return url, run, elapsed
+
+def summarize(args, url, run, elapsed):
+    raw = Histogram()
+    corrected = Histogram()
+    if args.mode == 'open':
+        # Open loop is corrected by construction: latency counts from the scheduled send
+        for latency, service in run.samples:
+            raw.record(service)
+            corrected.record(latency)
+        interval = 1000 / args.rate
+    else:
+        for _, service in run.samples:
+            raw.record(service)
+        interval = args.expected_interval_ms or raw.percentile(50) + args.think_ms
+        for _, service in run.samples:
+            corrected.record_corrected(service, interval)
+
+    total = len(run.samples)
+    return {
+        'target': args.target,
+        'url': url,
+        'mode': args.mode,
+        'timestamp': datetime.now().isoformat(),
+        'config': {
+            'rate': args.rate if args.mode == 'open' else None,
+            'arrivals': args.arrivals if args.mode == 'open' else None,
+            'concurrency': args.concurrency if args.mode == 'closed' else None,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'uniquePrompts': args.unique_prompts,
+            'expectedIntervalMs': round(interval, 3)
+        },
+        'requests': total,
+        'errors': run.errors,
+        'errorRate': round(run.errors / total, 4) if total else 0.0,
+        'throughput': round((total - run.errors) / elapsed, 2) if elapsed > 0 else 0.0,
+        'statuses': run.statuses,
+        'latency': corrected.snapshot(),
+        'serviceTime': raw.snapshot()
+    }
+
+def compare(result, baseline_path, max_regression):
+    """Print deltas against a saved run; True if within the allowed regression"""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+
+    ok = True
+    print(f'\nvs {baseline_path} ({baseline.get("timestamp")})')
+    for key in ('p50', 'p95', 'p99'):
+        before = baseline['latency']['percentilesMs'][key]
+        after = result['latency']['percentilesMs'][key]
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > max_regression:
+            ok = False
+            flag = '  REGRESSION'
+        print(f'  {key}: {before:.1f} -> {after:.1f} ms ({change:+.1%}){flag}')
+
+    before, after = baseline['throughput'], result['throughput']
+    change = (after - before) / before if before else 0.0
+    if change < -max_regression:
+        ok = False
+    print(f'  throughput: {before:.1f} -> {after:.1f} req/s ({change:+.1%})')
+
+    if result['errorRate'] > baseline['errorRate'] + 0.01:
+        ok = False
+    print(f'  error rate: {baseline["errorRate"]:.2%} -> {result["errorRate"]:.2%}')
+    return ok
+
+def report(result):
+    latency = result['latency']['percentilesMs']
+    service = result['serviceTime']['percentilesMs']
+    print(f'{result["target"]} {result["mode"]}-loop -> {result["url"]}')
+    print(f'  requests: {result["requests"]}  errors: {result["errors"]} ({result["errorRate"]:.2%})  statuses: {result["statuses"]}')
+    print(f'  throughput: {result["throughput"]} req/s')
+    print(f'  latency (CO-corrected) p50/p95/p99: {latency["p50"]:.1f} / {latency["p95"]:.1f} / {latency["p99"]:.1f} ms')
+    print(f'  service time           p50/p95/p99: {service["p50"]:.1f} / {service["p95"]:.1f} / {service["p99"]:.1f} ms')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load-test the MCP completion endpoints')
+    parser.add_argument('target', choices=sorted(TARGETS))
+    parser.add_argument('--base-url', help='override the target origin')
+    parser.add_argument('--mode', choices=['open', 'closed'], default='open')
+    parser.add_argument('--rate', type=float, default=20, help='open loop: requests per second')
+    parser.add_argument('--arrivals', choices=['fixed', 'poisson'], default='fixed')
+    parser.add_argument('--max-outstanding', type=int, default=1000, help='open loop: cap on in-flight requests')
+    parser.add_argument('--concurrency', type=int, default=16, help='closed loop: workers')
+    parser.add_argument('--think-ms', type=float, default=0, help='closed loop: pause between requests')
+    parser.add_argument('--expected-interval-ms', type=float,
+                        help='closed loop: interval for coordinated-omission correction (default: median + think time)')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds before the run')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--prompt', default='Write a Python function that reverses a linked list.')
+    parser.add_argument('--unique-prompts', action='store_true', help='make every prompt unique to bypass caching')
+    parser.add_argument('--model')
+    parser.add_argument('--max-tokens', type=int, default=256)
+    parser.add_argument('--out', help='write the JSON result here')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.1,
+                        help='allowed relative p50/p95/p99 or throughput regression before failing')
+    return parser.parse_args()
+
+async def main():
+    args = parse_args()
+    url, run, elapsed = await run_load(args)
+    result = summarize(args, url, run, elapsed)
+    report(result)
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'  saved: {args.out}')
+
+    if args.compare and not compare(result, args.compare, args.max_regression):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    asyncio.run(main())
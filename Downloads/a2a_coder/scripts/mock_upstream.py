@@ -0,0 +1,287 @@
+# scripts/mock_upstream.py (Local OpenAI/DeepSeek stand-in)
+"""
+Serves the chat/completions protocol the provider servers call, so they
+can be load-tested without spending API credits.
+
+    python scripts/mock_upstream.py --port 9000 --profile openai
+
+Point the servers at it:
+    OPENAI_BASE_URL=http://localhost:9000/v1
+    DEEPSEEK_API_BASE=http://localhost:9000
+
+Paths under /v1 answer in OpenAI's shape (usage.prompt_tokens_details);
+other paths answer in DeepSeek's (prompt_cache_hit_tokens and
+prompt_cache_miss_tokens from a simulated 64-token prefix cache).
+A request can pick another latency profile with an X-Mock-Profile header.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from quart import Quart, jsonify, make_response, request
+
+# Time to first token, its distribution and spread, and generation speed
+PROFILES = {
+    'instant': {'ttft_ms': 0, 'dist': 'constant', 'spread': 0.0, 'tokens_per_sec': 0},
+    'openai': {'ttft_ms': 450, 'dist': 'lognormal', 'spread': 0.5, 'tokens_per_sec': 60},
+    'deepseek': {'ttft_ms': 800, 'dist': 'lognormal', 'spread': 0.7, 'tokens_per_sec': 30},
+    'degraded': {'ttft_ms': 3000, 'dist': 'lognormal', 'spread': 1.0, 'tokens_per_sec': 10,
+                 'error_rate': 0.05, 'rate_limit_rate': 0.1}
+}
+
+WORDS = (
+    'the function returns a value for each input and the loop checks every item in the list '
+    'before it writes the result to the output so that callers can handle errors cleanly'
+).split()
+
+CACHE_UNIT_CHARS = 256
+
+def sample_ms(dist, mean, spread):
+    """Draw one latency in milliseconds"""
+    if mean <= 0:
+        return 0.0
+    if dist == 'uniform':
+        return random.uniform(mean * (1 - spread), mean * (1 + spread))
+    if dist == 'normal':
+        return max(0.0, random.gauss(mean, mean * spread))
+    if dist == 'exponential':
+        return random.expovariate(1 / mean)
+    if dist == 'lognormal':
+        # Mean-preserving: exp(N(-s^2/2, s)) has expectation 1
+        return mean * math.exp(random.gauss(-spread * spread / 2, spread))
+    return float(mean)
+
+def count_tokens(text):
+    """Rough tokenizer: about four characters per token"""
+    return max(1, len(text) // 4)
+
+class PrefixCache:
+    """DeepSeek-style context cache over 64-token prompt prefix units"""
+
+    def __init__(self, max_units=100000):
+        self.units = OrderedDict()
+        self.max_units = max_units
+
+    def hit_tokens(self, text):
+        """Tokens of the longest previously seen prefix; remembers this prompt's prefixes"""
+        digest = hashlib.sha256()
+        hits = 0
+        matching = True
+        for start in range(0, len(text) - CACHE_UNIT_CHARS + 1, CACHE_UNIT_CHARS):
+            digest.update(text[start:start + CACHE_UNIT_CHARS].encode())
+            key = digest.copy().hexdigest()
+            if matching and key in self.units:
+                self.units.move_to_end(key)
+                hits += 1
+            else:
+                matching = False
+                self.units[key] = True
+        while len(self.units) > self.max_units:
+            self.units.popitem(last=False)
+        return hits * CACHE_UNIT_CHARS // 4
+
+class RequestWindow:
+    """Requests per rolling minute, for real 429s"""
+
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self.times = deque()
+
+    def admit(self):
+        if self.rpm <= 0:
+            return True, 0
+        now = time.monotonic()
+        while self.times and self.times[0] <= now - 60:
+            self.times.popleft()
+        if len(self.times) >= self.rpm:
+            return False, max(1, math.ceil(self.times[0] + 60 - now))
+        self.times.append(now)
+        return True, 0
+
+def create_app(args):
+    app = Quart(__name__)
+    prefix_cache = PrefixCache()
+    window = RequestWindow(args.rpm)
+    base = {
+        **PROFILES[args.profile],
+        **{key: value for key, value in {
+            'ttft_ms': args.ttft_ms,
+            'dist': args.dist,
+            'spread': args.spread,
+            'tokens_per_sec': args.tokens_per_sec,
+            'error_rate': args.error_rate,
+            'rate_limit_rate': args.rate_limit_rate
+        }.items() if value is not None}
+    }
+    stats = {
+        'requests': 0,
+        'streams': 0,
+        'errors': 0,
+        'rateLimited': 0,
+        'promptTokens': 0,
+        'completionTokens': 0,
+        'cacheHitTokens': 0
+    }
+
+    def profile():
+        name = request.headers.get('X-Mock-Profile')
+        return {**base, **PROFILES[name]} if name in PROFILES else base
+
+    def error(status, message, kind, headers=None):
+        return jsonify({'error': {'message': message, 'type': kind, 'code': kind}}), status, headers or {}
+
+    def usage(openai_shape, prompt_tokens, completion_tokens, hit_tokens):
+        block = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+        if openai_shape:
+            block['prompt_tokens_details'] = {'cached_tokens': hit_tokens}
+        else:
+            block['prompt_cache_hit_tokens'] = hit_tokens
+            block['prompt_cache_miss_tokens'] = prompt_tokens - hit_tokens
+        return block
+
+    @app.route('/chat/completions', methods=['POST'])
+    @app.route('/v1/chat/completions', methods=['POST'])
+    async def chat_completions():
+        settings = profile()
+        stats['requests'] += 1
+
+        admitted, retry_after = window.admit()
+        if not admitted or random.random() < settings.get('rate_limit_rate', 0):
+            stats['rateLimited'] += 1
+            return error(429, 'Rate limit reached for requests', 'rate_limit_exceeded',
+                         {'Retry-After': str(retry_after or 1)})
+        if random.random() < settings.get('error_rate', 0):
+            stats['errors'] += 1
+            await asyncio.sleep(sample_ms(settings['dist'], settings['ttft_ms'], settings['spread']) / 1000)
+            return error(500, 'The server had an error while processing your request', 'server_error')
+
+        body = await request.get_json()
+        model = body.get('model', 'mock')
+        text = ''.join(str(message.get('content', '')) for message in body.get('messages', []))
+        prompt_tokens = count_tokens(text)
+        hit_tokens = min(prompt_tokens, prefix_cache.hit_tokens(text))
+        max_tokens = int(body.get('max_tokens') or 512)
+        completion_tokens = max(1, min(max_tokens, round(random.gauss(args.completion_tokens, args.completion_tokens * 0.3))))
+        words = [random.choice(WORDS) for _ in range(completion_tokens)]
+        openai_shape = request.path.startswith('/v1/')
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:24]}'
+        created = int(time.time())
+        stats['promptTokens'] += prompt_tokens
+        stats['completionTokens'] += completion_tokens
+        stats['cacheHitTokens'] += hit_tokens
+
+        ttft = sample_ms(settings['dist'], settings['ttft_ms'], settings['spread']) / 1000
+        per_token = 1 / settings['tokens_per_sec'] if settings['tokens_per_sec'] else 0
+
+        if not body.get('stream'):
+            await asyncio.sleep(ttft + per_token * completion_tokens)
+            return jsonify({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ' '.join(words)},
+                    'finish_reason': 'length' if completion_tokens == max_tokens else 'stop'
+                }],
+                'usage': usage(openai_shape, prompt_tokens, completion_tokens, hit_tokens)
+            })
+
+        stats['streams'] += 1
+        include_usage = (body.get('stream_options') or {}).get('include_usage')
+
+        def chunk(delta, finish_reason=None, usage_block=None):
+            payload = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [] if usage_block else [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }
+            if usage_block:
+                payload['usage'] = usage_block
+            return f'data: {json.dumps(payload)}\n\n'
+
+        async def generate():
+            await asyncio.sleep(ttft)
+            yield chunk({'role': 'assistant', 'content': ''})
+            for i, word in enumerate(words):
+                yield chunk({'content': word if i == 0 else f' {word}'})
+                if per_token:
+                    await asyncio.sleep(per_token)
+            yield chunk({}, 'length' if completion_tokens == max_tokens else 'stop')
+            if include_usage:
+                yield chunk(None, usage_block=usage(openai_shape, prompt_tokens, completion_tokens, hit_tokens))
+            yield 'data: [DONE]\n\n'
+
+        response = await make_response(generate(), {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        response.timeout = None
+        return response
+
+    @app.route('/models', methods=['GET'])
+    @app.route('/v1/models', methods=['GET'])
+    async def models():
+        return jsonify({'object': 'list', 'data': [
+            {'id': name, 'object': 'model', 'owned_by': 'mock'}
+            for name in ('gpt-4', 'gpt-4-turbo-preview', 'gpt-3.5-turbo', 'deepseek-coder', 'deepseek-chat')
+        ]})
+
+    @app.route('/v1/embeddings', methods=['POST'])
+    async def embeddings():
+        body = await request.get_json()
+        inputs = body.get('input')
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        data = []
+        for i, text in enumerate(inputs):
+            seed = random.Random(hashlib.sha256(str(text).encode()).digest())
+            data.append({'object': 'embedding', 'index': i, 'embedding': [seed.uniform(-1, 1) for _ in range(256)]})
+        tokens = sum(count_tokens(str(text)) for text in inputs)
+        return jsonify({'object': 'list', 'data': data, 'model': body.get('model'),
+                        'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}})
+
+    @app.route('/mock/stats', methods=['GET'])
+    async def mock_stats():
+        return jsonify({**stats, 'settings': base})
+
+    return app
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Local chat/completions stand-in for load tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='openai')
+    parser.add_argument('--ttft-ms', type=float, help='mean time to first token')
+    parser.add_argument('--dist', choices=['constant', 'uniform', 'normal', 'lognormal', 'exponential'])
+    parser.add_argument('--spread', type=float, help='relative spread (lognormal sigma)')
+    parser.add_argument('--tokens-per-sec', type=float, help='generation speed; 0 = no delay')
+    parser.add_argument('--completion-tokens', type=int, default=120, help='mean reply length')
+    parser.add_argument('--error-rate', type=float, help='share of requests answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, help='share of requests answered with 429')
+    parser.add_argument('--rpm', type=int, default=0, help='real requests/minute limit; 0 = none')
+    parser.add_argument('--seed', type=int)
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    config = Config()
+    config.bind = [f'{args.host}:{args.port}']
+    config.keep_alive_timeout = 75
+    print(f"[Mock Upstream] {args.profile} profile on http://{args.host}:{args.port}")
+    asyncio.run(serve(create_app(args), config))
@@ -3,34 +3,980 @@
 import json
 import sys
 import asyncio
-from typing import Any, Dict, List, Optional
-import subprocess
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TextIO, Tuple
 import os
 import tempfile
 import uuid
+import ast
+import importlib
+import io
+import random
+import select
+import shutil
+import signal
+import socket
+import stat
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import asynccontextmanager, redirect_stdout, redirect_stderr
+
+# Kernel settings
+CELL_TIMEOUT = float(os.environ.get("JUPYTER_MCP_CELL_TIMEOUT", "30"))
+INSTALL_TIMEOUT = float(os.environ.get("JUPYTER_MCP_INSTALL_TIMEOUT", "60"))
+MAX_TIMEOUT = float(os.environ.get("JUPYTER_MCP_MAX_TIMEOUT", "3600"))
+# How long an interrupted cell gets to unwind before its kernel is killed
+INTERRUPT_GRACE = float(os.environ.get("JUPYTER_MCP_INTERRUPT_GRACE", "2"))
+KERNEL_IDLE_TIMEOUT = float(os.environ.get("JUPYTER_MCP_KERNEL_IDLE_TIMEOUT", "600"))
+KERNEL_START_TIMEOUT = float(os.environ.get("JUPYTER_MCP_KERNEL_START_TIMEOUT", "30"))
+KERNEL_POOL_SIZE = int(os.environ.get("JUPYTER_MCP_KERNEL_POOL", "2"))
+KERNEL_LINE_LIMIT = 64 * 1024 * 1024
+
+# Output streaming: kernels send cell output in chunks cut at line ends, at
+# least every STREAM_INTERVAL seconds or once STREAM_CHUNK characters are
+# waiting. The server keeps the last OUTPUT_LIMIT characters of each stream
+# and spills the whole stream to SPILL_DIR once it outgrows that. A
+# notebook's spill files are deleted with its kernel, and all of them at
+# shutdown; until then files older than SPILL_MAX_AGE seconds go, as do the
+# oldest ones while SPILL_DIR holds more than SPILL_MAX_MB (0 turns a cap off).
+STREAM_INTERVAL = float(os.environ.get("JUPYTER_MCP_STREAM_INTERVAL", "0.1"))
+STREAM_CHUNK = int(os.environ.get("JUPYTER_MCP_STREAM_CHUNK", "65536"))
+OUTPUT_LIMIT = int(os.environ.get("JUPYTER_MCP_OUTPUT_LIMIT", "65536"))
+SPILL_DIR = os.environ.get("JUPYTER_MCP_SPILL_DIR") or os.path.join(tempfile.gettempdir(), "jupyter-mcp-output")
+SPILL_MAX_AGE = float(os.environ.get("JUPYTER_MCP_SPILL_MAX_AGE", "86400"))
+SPILL_MAX_MB = float(os.environ.get("JUPYTER_MCP_SPILL_MAX_MB", "1024"))
+
+# Receives each chunk of cell output as (stream name, text)
+OutputCallback = Callable[[str, str], Awaitable[None]]
+
+# Zygote settings: modules imported once and shared by every forked kernel
+USE_ZYGOTE = os.environ.get("JUPYTER_MCP_ZYGOTE", "1").lower() not in ("0", "false", "no") and hasattr(os, "fork")
+PRELOAD_MODULES = [m.strip() for m in os.environ.get("JUPYTER_MCP_PRELOAD", "numpy,pandas,matplotlib.pyplot").split(",") if m.strip()]
+ZYGOTE_START_TIMEOUT = float(os.environ.get("JUPYTER_MCP_ZYGOTE_START_TIMEOUT", "120"))
+
+# Per-client limits on cells, visualizations and installs in flight
+CLIENT_MAX_EXECUTIONS = int(os.environ.get("JUPYTER_MCP_CLIENT_MAX_EXECUTIONS", "4"))
+CLIENT_MAX_QUEUED = int(os.environ.get("JUPYTER_MCP_CLIENT_MAX_QUEUED", "16"))
+EXECUTION_TOOLS = {"execute_cell", "create_visualization", "install_package"}
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+SERVER_ERROR = -32000
+
+def kernel_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("MPLBACKEND", "Agg")
+    return env
+
+def run_cell(code: str, namespace: Dict[str, Any], count: int) -> None:
+    """Execute a cell; like Jupyter, echo the value of a trailing expression"""
+    filename = f"<cell-{count}>"
+    tree = ast.parse(code, filename, "exec")
+    last = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+    exec(compile(tree, filename, "exec"), namespace)
+    if last is not None:
+        value = eval(compile(ast.Expression(last.value), filename, "eval"), namespace)
+        if value is not None:
+            print(repr(value))
+
+def format_cell_error(error: BaseException) -> str:
+    """Traceback starting at the cell's own frames"""
+    tb = error.__traceback__
+    while tb is not None and not tb.tb_frame.f_code.co_filename.startswith("<cell-"):
+        tb = tb.tb_next
+    return "".join(traceback.format_exception(type(error), error, tb))
+
+def deadline(args: Dict[str, Any], default: float) -> float:
+    """The call's timeout argument in seconds, checked against MAX_TIMEOUT"""
+    timeout = float(args.get("timeout", default))
+    if not 0 < timeout <= MAX_TIMEOUT:
+        raise ValueError(f"timeout must be between 0 and {MAX_TIMEOUT:g} seconds")
+    return timeout
+
+class CellStream(io.TextIOBase):
+    """Stands in for sys.stdout or sys.stderr during a cell and forwards output in chunks"""
+    
+    encoding = "utf-8"
+    
+    def __init__(self, name: str, emit: Callable[[str, str], None]):
+        self.name = name
+        self.emit = emit
+        self.pending: List[str] = []
+        self.size = 0
+        self.stale = False
+        self.lock = threading.Lock()
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, text: str) -> int:
+        if not isinstance(text, str):
+            raise TypeError(f"write() argument must be str, not {type(text).__name__}")
+        with self.lock:
+            self.pending.append(text)
+            self.size += len(text)
+            if self.size >= STREAM_CHUNK:
+                self.send(whole_lines=False)
+        return len(text)
+    
+    def flush(self) -> None:
+        with self.lock:
+            if self.pending:
+                self.send(whole_lines=False)
+    
+    def tick(self) -> None:
+        """Timer flush: whole lines now, a partial line once it has waited a full interval"""
+        with self.lock:
+            if self.pending:
+                self.send(whole_lines=not self.stale)
+            self.stale = bool(self.pending)
+    
+    def send(self, whole_lines: bool) -> None:
+        text = "".join(self.pending)
+        cut = text.rfind("\n") + 1 if whole_lines else len(text)
+        # Slice one huge write so no protocol line outgrows the server's read limit
+        for start in range(0, cut, STREAM_CHUNK):
+            self.emit(self.name, text[start:min(start + STREAM_CHUNK, cut)])
+        rest = text[cut:]
+        self.pending = [rest] if rest else []
+        self.size = len(rest)
+
+def serve_kernel(commands: Any, channel: Any) -> None:
+    """Run cells read from commands in one namespace and reply on channel as JSON lines
+
+    Output is sent as "stream" messages while the cell runs, so neither
+    side holds more than a chunk of it. SIGINT interrupts the running cell
+    and is ignored between cells, so an interrupt that arrives late cannot
+    kill an idle kernel.
+    """
+    channel_lock = threading.Lock()
+    streams: List[CellStream] = []
+    
+    def send(message: Dict[str, Any]) -> None:
+        with channel_lock:
+            channel.write(json.dumps(message) + "\n")
+            channel.flush()
+    
+    def pump() -> None:
+        while True:
+            time.sleep(STREAM_INTERVAL)
+            for stream in list(streams):
+                stream.tick()
+    
+    threading.Thread(target=pump, daemon=True).start()
+    
+    # Cells that read stdin get EOF rather than the next command
+    sys.stdin = io.StringIO()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    namespace = {"__name__": "__main__"}
+    count = 0
+    send({"type": "ready", "pid": os.getpid()})
+    
+    for line in commands:
+        message = json.loads(line)
+        count += 1
+        
+        def emit(name: str, text: str, request_id: Any = message["id"]) -> None:
+            send({"id": request_id, "type": "stream", "name": name, "text": text})
+        
+        stdout, stderr = CellStream("stdout", emit), CellStream("stderr", emit)
+        streams[:] = [stdout, stderr]
+        error = None
+        started = time.perf_counter()
+        
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                signal.signal(signal.SIGINT, signal.default_int_handler)
+                run_cell(message["code"], namespace, count)
+            except BaseException as e:
+                error = format_cell_error(e)
+            finally:
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+        
+        # Everything the cell wrote goes out before its result
+        streams.clear()
+        stdout.flush()
+        stderr.flush()
+        send({
+            "id": message["id"],
+            "type": "result",
+            "error": error,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3)
+        })
+
+def run_kernel() -> None:
+    """Standalone kernel process speaking the protocol over stdin/stdout"""
+    # Keep the real stdout for the protocol; fd-level writes from cells go to stderr instead
+    channel = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    serve_kernel(sys.stdin, channel)
+
+def run_zygote(path: str) -> None:
+    """Fork server: preload modules once, then fork a kernel for each connection to path"""
+    channel = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    
+    preloaded, failed = [], {}
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+            preloaded.append(name)
+        except Exception as e:
+            failed[name] = f"{type(e).__name__}: {e}"
+    
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(16)
+    # Forked kernels are reaped automatically; the server watches their sockets instead
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    channel.write(json.dumps({"type": "ready", "pid": os.getpid(), "preloaded": preloaded, "failed": failed}) + "\n")
+    channel.close()
+    
+    while True:
+        readable, _, _ = select.select([listener, sys.stdin], [], [])
+        if sys.stdin in readable:
+            # The server closed our stdin or exited
+            return
+        conn, _ = listener.accept()
+        if os.fork() == 0:
+            listener.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+            # Forks share the zygote's random state; give each kernel its own
+            random.seed()
+            if "numpy" in sys.modules:
+                sys.modules["numpy"].random.seed()
+            serve_kernel(conn.makefile("r", encoding="utf-8"), conn.makefile("w", encoding="utf-8"))
+            os._exit(0)
+        conn.close()
+
+class Zygote:
+    """Server-side handle on the fork server process"""
+    
+    def __init__(self, modules: List[str]):
+        self.modules = modules
+        self.process = None
+        self.directory = None
+        self.path = None
+        self.ready = {}
+        self.ready_ms = 0.0
+    
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+    
+    async def start(self) -> None:
+        """Spawn the zygote and wait until its modules are imported"""
+        started = time.perf_counter()
+        self.ready = {}
+        self.directory = tempfile.mkdtemp(prefix="jupyter-mcp-")
+        self.path = os.path.join(self.directory, "zygote.sock")
+        env = kernel_env()
+        env["JUPYTER_MCP_PRELOAD"] = ",".join(self.modules)
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--zygote", self.path,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env=env
+        )
+        try:
+            line = await asyncio.wait_for(self.process.stdout.readline(), ZYGOTE_START_TIMEOUT)
+            if not line:
+                raise RuntimeError("Zygote exited during preload")
+        except BaseException:
+            await self.shutdown()
+            raise
+        self.ready = json.loads(line)
+        self.ready_ms = round((time.perf_counter() - started) * 1000, 3)
+    
+    async def fork(self) -> Any:
+        """Ask for a fresh kernel; returns the (reader, writer) pair connected to it"""
+        return await asyncio.open_unix_connection(self.path, limit=KERNEL_LINE_LIMIT)
+    
+    async def shutdown(self) -> None:
+        if self.alive:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 2)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def describe(self) -> str:
+        if not self.alive:
+            return "stopped"
+        if not self.ready:
+            return f"pid {self.process.pid}, preloading {', '.join(self.modules)}"
+        text = f"pid {self.process.pid}, preloaded {', '.join(self.ready.get('preloaded')) or 'nothing'} in {self.ready_ms:.0f} ms"
+        if self.ready.get("failed"):
+            text += f"; skipped {', '.join(self.ready['failed'])}"
+        return text
+
+class Kernel:
+    """A long-lived Python process holding one notebook's namespace"""
+    
+    def __init__(self):
+        self.key = None
+        self.process = None
+        self.reader = None
+        self.writer = None
+        self.pid = None
+        self.killed = False
+        self.interrupts = 0
+        self.on_output = None
+        self.lock = asyncio.Lock()
+        self.sequence = 0
+        self.executions = 0
+        self.last_used = time.monotonic()
+        self.ready_ms = 0.0
+    
+    @property
+    def alive(self) -> bool:
+        if self.reader is None or self.killed or self.reader.at_eof():
+            return False
+        return self.process is None or self.process.returncode is None
+    
+    async def start(self, zygote: Optional[Zygote] = None) -> None:
+        """Fork from the zygote, or spawn a fresh interpreter without one, and wait for ready"""
+        started = time.perf_counter()
+        if zygote is not None:
+            self.reader, self.writer = await zygote.fork()
+        else:
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.abspath(__file__), "--kernel",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                env=kernel_env(),
+                limit=KERNEL_LINE_LIMIT
+            )
+            self.reader, self.writer = self.process.stdout, self.process.stdin
+        try:
+            ready = await asyncio.wait_for(self.read(), KERNEL_START_TIMEOUT)
+        except BaseException:
+            await self.kill()
+            raise
+        self.pid = ready["pid"]
+        self.ready_ms = round((time.perf_counter() - started) * 1000, 3)
+    
+    async def read(self) -> Dict[str, Any]:
+        line = await self.reader.readline()
+        if not line:
+            raise RuntimeError("Kernel exited unexpectedly")
+        return json.loads(line)
+    
+    async def execute(self, code: str, timeout: float,
+                      on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Run one cell, passing each chunk of its output to on_output(stream, text)
+        
+        Past the timeout, or when the calling task is cancelled, the cell is
+        interrupted. A timed-out cell that unwinds returns its result marked
+        timed_out; one that doesn't gets its kernel killed, and TimeoutError
+        is raised.
+        """
+        async with self.lock:
+            self.sequence += 1
+            request_id = self.sequence
+            self.on_output = on_output
+            self.writer.write((json.dumps({"id": request_id, "code": code}) + "\n").encode())
+            await self.writer.drain()
+            
+            try:
+                result = await asyncio.wait_for(self.reply(request_id), timeout)
+            except asyncio.TimeoutError:
+                result = await self.interrupt(request_id)
+                if result is None:
+                    raise
+                result["timed_out"] = True
+            except asyncio.CancelledError:
+                # Shielded so a second cancel cannot leave the cell running
+                await asyncio.shield(self.interrupt(request_id))
+                raise
+            except Exception:
+                # The kernel died or sent a bad message mid-cell; never hand it another one
+                await self.kill()
+                raise
+            self.executions += 1
+            self.last_used = time.monotonic()
+            return result
+    
+    async def reply(self, request_id: int) -> Dict[str, Any]:
+        while True:
+            message = await self.read()
+            if message.get("id") != request_id:
+                continue
+            if message.get("type") == "result":
+                return message
+            if message.get("type") == "stream" and self.on_output is not None:
+                await self.on_output(message["name"], message["text"])
+    
+    async def interrupt(self, request_id: int) -> Optional[Dict[str, Any]]:
+        """SIGINT the running cell and wait for it to unwind; kill the kernel if it won't"""
+        self.interrupts += 1
+        try:
+            os.kill(self.pid, signal.SIGINT)
+            return await asyncio.wait_for(self.reply(request_id), INTERRUPT_GRACE)
+        except Exception:
+            # Timed out, exited or out of step on the protocol: no further cell can trust it
+            await self.kill()
+            return None
+    
+    async def kill(self) -> None:
+        self.killed = True
+        if self.process is not None:
+            if self.process.returncode is None:
+                self.process.kill()
+            await self.process.wait()
+        elif self.pid is not None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        if self.writer is not None:
+            self.writer.close()
+    
+    async def shutdown(self) -> None:
+        """Close the kernel's input so it exits, killing it if it doesn't"""
+        if not self.alive:
+            return
+        if self.lock.locked():
+            # Mid-cell, so it would not see EOF until the cell finishes
+            await self.kill()
+            return
+        self.writer.close()
+        if self.process is not None:
+            try:
+                await asyncio.wait_for(self.process.wait(), 2)
+            except asyncio.TimeoutError:
+                await self.kill()
+    
+    def describe(self) -> str:
+        if not self.alive:
+            return "stopped"
+        idle = time.monotonic() - self.last_used
+        return f"running (pid {self.pid}, {self.executions} cells, idle {idle:.0f}s)"
+
+class KernelManager:
+    """Starts, reuses, restarts and reaps per-notebook kernels
+    
+    New kernels fork from a zygote that has already imported the scientific
+    stack, and a few idle ones are kept forked ahead of demand, so a new
+    notebook's first cell runs at warm-kernel speed.
+    """
+    
+    def __init__(self, idle_timeout: float = KERNEL_IDLE_TIMEOUT, pool_size: int = KERNEL_POOL_SIZE,
+                 preload: List[str] = PRELOAD_MODULES, use_zygote: bool = USE_ZYGOTE):
+        self.idle_timeout = idle_timeout
+        self.pool_size = pool_size
+        self.zygote = Zygote(preload) if use_zygote else None
+        self.zygote_lock = asyncio.Lock()
+        self.kernels: Dict[str, Kernel] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.pool: List[Kernel] = []
+        self.scratch: List[Kernel] = []
+        self.spills = SpillFiles()
+        self.filling = None
+        self.reaper = None
+        self.stats = {
+            "started": 0,
+            "restarts": 0,
+            "reaped": 0,
+            "pool_hits": 0,
+            "pool_misses": 0,
+            "interrupts": 0,
+            "killed": 0,
+            "scratch": 0,
+            "forks": 0,
+            "fork_ms_total": 0.0,
+            "fork_ms_last": 0.0
+        }
+    
+    async def start(self) -> None:
+        """Warm up the zygote and the idle pool ahead of the first cell"""
+        self.spills.adopt()
+        await self.zygote_ready()
+        self.refill()
+    
+    async def zygote_ready(self) -> Optional[Zygote]:
+        """The running zygote, (re)starting it if needed; None means spawn kernels directly"""
+        if self.zygote is None:
+            return None
+        async with self.zygote_lock:
+            if self.zygote is not None and not self.zygote.alive:
+                # Clear out a zygote that died before starting its replacement
+                await self.zygote.shutdown()
+                try:
+                    await self.zygote.start()
+                except Exception as e:
+                    print(f"Zygote unavailable, spawning kernels directly: {e}", file=sys.stderr)
+                    self.zygote = None
+        return self.zygote
+    
+    async def spawn(self) -> Kernel:
+        kernel = Kernel()
+        await kernel.start(await self.zygote_ready())
+        self.stats["forks"] += 1
+        self.stats["fork_ms_total"] += kernel.ready_ms
+        self.stats["fork_ms_last"] = kernel.ready_ms
+        return kernel
+    
+    def refill(self) -> None:
+        """Top the idle pool back up in the background"""
+        if self.pool_size > 0 and (self.filling is None or self.filling.done()):
+            self.filling = asyncio.create_task(self.fill_pool())
+    
+    async def fill_pool(self) -> None:
+        while len(self.pool) < self.pool_size:
+            try:
+                kernel = await self.spawn()
+            except Exception as e:
+                print(f"Kernel pool refill failed: {e}", file=sys.stderr)
+                return
+            self.pool.append(kernel)
+    
+    async def get(self, key: str) -> Kernel:
+        """The running kernel for key, taking one from the pool if needed"""
+        if self.reaper is None and self.idle_timeout > 0:
+            self.reaper = asyncio.create_task(self.reap_idle())
+        
+        async with self.locks.setdefault(key, asyncio.Lock()):
+            kernel = self.kernels.get(key)
+            if kernel and kernel.alive:
+                return kernel
+            if kernel:
+                self.stats["restarts"] += 1
+                self.spills.release(key)
+            
+            kernel = await self.take()
+            kernel.key = key
+            kernel.last_used = time.monotonic()
+            self.kernels[key] = kernel
+            self.stats["started"] += 1
+            return kernel
+    
+    async def take(self) -> Kernel:
+        """A fresh kernel from the idle pool, or a newly spawned one if it is empty"""
+        while self.pool and not self.pool[-1].alive:
+            self.pool.pop()
+        if self.pool:
+            kernel = self.pool.pop()
+            self.stats["pool_hits"] += 1
+        else:
+            self.stats["pool_misses"] += 1
+            kernel = await self.spawn()
+        self.refill()
+        return kernel
+    
+    async def execute(self, key: str, code: str, timeout: float,
+                      on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Run a cell in key's kernel, dropping the kernel straight away if it had to be killed"""
+        kernel = await self.get(key)
+        interrupts = kernel.interrupts
+        try:
+            return await kernel.execute(code, timeout, on_output)
+        finally:
+            self.stats["interrupts"] += kernel.interrupts - interrupts
+            if not kernel.alive and self.kernels.get(key) is kernel:
+                # The next cell takes a pooled kernel; refill the pool behind it now
+                del self.kernels[key]
+                self.spills.release(key)
+                self.stats["killed"] += 1
+                self.refill()
+    
+    async def execute_scratch(self, code: str, timeout: float,
+                              on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Run a cell outside any notebook in a kernel of its own, discarded afterwards"""
+        kernel = await self.take()
+        self.scratch.append(kernel)
+        try:
+            return await kernel.execute(code, timeout, on_output)
+        finally:
+            self.stats["interrupts"] += kernel.interrupts
+            self.scratch.remove(kernel)
+            await kernel.kill()
+            self.stats["scratch"] += 1
+
+    async def restart(self, key: str) -> Kernel:
+        kernel = self.kernels.pop(key, None)
+        if kernel:
+            await kernel.shutdown()
+            self.spills.release(key)
+            self.stats["restarts"] += 1
+        return await self.get(key)
+    
+    async def reap_idle(self) -> None:
+        """Shut down kernels nobody has used for idle_timeout seconds, and expire old spill files"""
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 30))
+            now = time.monotonic()
+            for key, kernel in list(self.kernels.items()):
+                if now - kernel.last_used > self.idle_timeout and not kernel.lock.locked():
+                    del self.kernels[key]
+                    await kernel.shutdown()
+                    self.spills.release(key)
+                    self.stats["reaped"] += 1
+            self.spills.trim()
+    
+    async def shutdown_all(self) -> None:
+        for task in (self.reaper, self.filling):
+            if task:
+                task.cancel()
+        for kernel in self.pool + self.scratch + list(self.kernels.values()):
+            await kernel.shutdown()
+        self.pool.clear()
+        self.kernels.clear()
+        self.spills.clear()
+        if self.zygote is not None:
+            await self.zygote.shutdown()
+    
+    def describe(self) -> str:
+        """Markdown summary of the zygote, the pool and fork timings"""
+        lookups = self.stats["pool_hits"] + self.stats["pool_misses"]
+        hit_rate = self.stats["pool_hits"] / lookups if lookups else 0.0
+        forks = self.stats["forks"]
+        average = self.stats["fork_ms_total"] / forks if forks else 0.0
+        
+        text = "## Kernels\n\n"
+        text += f"- Zygote: {self.zygote.describe() if self.zygote else 'disabled'}\n"
+        text += f"- Pool: {len(self.pool)}/{self.pool_size} idle, hit rate {hit_rate:.0%} ({self.stats['pool_hits']} hits, {self.stats['pool_misses']} misses)\n"
+        text += f"- Fork-to-ready: last {self.stats['fork_ms_last']:.1f} ms, average {average:.1f} ms over {forks} kernels\n"
+        text += f"- Running: {len(self.kernels)}, restarts {self.stats['restarts']}, reaped {self.stats['reaped']}\n"
+        text += f"- Scratch cells: {len(self.scratch)} running, {self.stats['scratch']} run in throwaway kernels\n"
+        text += f"- Interrupted cells: {self.stats['interrupts']}, kernels killed {self.stats['killed']}\n"
+        text += f"- {self.spills.describe()}\n"
+        return text
+
+class SpillFiles:
+    """The spill files in SPILL_DIR, each tied to the notebook whose cell wrote it
+    
+    A notebook's files are released along with its kernel. Scratch cells'
+    files have no owner and, like leftovers from earlier runs, only go when
+    they age out or the size cap needs the room; the oldest go first.
+    """
+    
+    def __init__(self, directory: str = SPILL_DIR, max_age: float = SPILL_MAX_AGE, max_mb: float = SPILL_MAX_MB):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        # path -> [owner, created, size], oldest first; size is None while the file is being written
+        self.files: Dict[str, List[Any]] = {}
+        self.size = 0
+        self.stats = {"spilled": 0, "deleted": 0}
+    
+    def adopt(self) -> None:
+        """Take over files left in the directory by an earlier run, so they count against the caps"""
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        except FileNotFoundError:
+            return
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if entry.path not in self.files:
+                stats = entry.stat()
+                self.files[entry.path] = [None, stats.st_mtime, stats.st_size]
+                self.size += stats.st_size
+        self.files = dict(sorted(self.files.items(), key=lambda item: item[1][1]))
+        self.trim()
+    
+    def create(self, owner: Optional[str], label: str, name: str) -> Tuple[TextIO, str]:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=f"{label}-", suffix=f".{name}.txt", dir=self.directory)
+        self.files[path] = [owner, time.time(), None]
+        self.stats["spilled"] += 1
+        return os.fdopen(fd, "w", encoding="utf-8"), path
+    
+    def written(self, path: str) -> None:
+        """Count a finished file against the size cap, then trim the others to fit"""
+        entry = self.files.get(path)
+        if entry is None:
+            # Released while the cell was still writing it
+            return
+        try:
+            entry[2] = os.path.getsize(path)
+        except OSError:
+            del self.files[path]
+            return
+        self.size += entry[2]
+        self.trim(keep=path)
+    
+    def trim(self, keep: Optional[str] = None) -> None:
+        """Delete finished files past max_age, then the oldest while over max_bytes"""
+        cutoff = time.time() - self.max_age
+        for path, (_, created, size) in list(self.files.items()):
+            if size is None or path == keep:
+                continue
+            expired = self.max_age > 0 and created < cutoff
+            if not (expired or (self.max_bytes > 0 and self.size > self.max_bytes)):
+                break
+            self.delete(path)
+    
+    def release(self, owner: str) -> None:
+        """Delete a notebook's files once its kernel is gone"""
+        for path, entry in list(self.files.items()):
+            if entry[0] == owner:
+                self.delete(path)
+    
+    def clear(self) -> None:
+        for path in list(self.files):
+            self.delete(path)
+    
+    def delete(self, path: str) -> None:
+        _, _, size = self.files.pop(path)
+        self.size -= size or 0
+        try:
+            os.unlink(path)
+            self.stats["deleted"] += 1
+        except FileNotFoundError:
+            pass
+    
+    def describe(self) -> str:
+        return (f"Spilled output: {len(self.files)} files, {self.size / 1024 / 1024:.1f} MB in {self.directory} "
+                f"({self.stats['spilled']} spilled, {self.stats['deleted']} deleted)")
+
+class OutputBuffer:
+    """A cell stream's output, kept to the last `limit` characters
+    
+    Once the stream outgrows the limit, all of it, including what came
+    earlier, is also written to a spill file, so nothing is lost and memory
+    stays bounded however much the cell prints. The file belongs to owner,
+    the notebook the cell ran in, or None for a scratch cell.
+    """
+    
+    def __init__(self, name: str, label: str, spills: SpillFiles, owner: Optional[str] = None, limit: int = OUTPUT_LIMIT):
+        self.name = name
+        self.label = label
+        self.limit = limit
+        self.spills = spills
+        self.owner = owner
+        self.chunks = deque()
+        self.size = 0
+        self.total = 0
+        self.spill = None
+        self.spill_path = None
+    
+    def append(self, text: str) -> None:
+        self.total += len(text)
+        if self.spill is None and self.size + len(text) > self.limit:
+            self.spill, self.spill_path = self.spills.create(self.owner, self.label, self.name)
+            self.spill.writelines(self.chunks)
+        if self.spill is not None:
+            self.spill.write(text)
+        
+        self.chunks.append(text)
+        self.size += len(text)
+        while self.size > self.limit:
+            excess = self.size - self.limit
+            head = self.chunks[0]
+            if len(head) <= excess:
+                self.chunks.popleft()
+                self.size -= len(head)
+            else:
+                self.chunks[0] = head[excess:]
+                self.size -= excess
+    
+    def close(self) -> None:
+        if self.spill is not None:
+            self.spill.close()
+            self.spills.written(self.spill_path)
+    
+    def render(self) -> str:
+        text = "".join(self.chunks)
+        if self.spill_path is None:
+            return text
+        return f"[last {self.size} of {self.total} characters; full {self.name} in {self.spill_path}]\n...{text}"
+
+class StdioTransport:
+    """Newline-delimited JSON over stdin/stdout without blocking the event loop
+    
+    Pipes and sockets are driven by the loop directly; anything else (a
+    terminal or a redirected file) falls back to a reader thread and plain
+    writes, which never leaves the shared terminal in non-blocking mode.
+    """
+    
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+    
+    @staticmethod
+    def is_stream(stream: Any) -> bool:
+        mode = os.fstat(stream.fileno()).st_mode
+        return stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode)
+    
+    async def open(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.is_stream(sys.stdin):
+            self.reader = asyncio.StreamReader(limit=KERNEL_LINE_LIMIT)
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(self.reader), sys.stdin)
+        if self.is_stream(sys.stdout):
+            transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+            self.writer = asyncio.StreamWriter(transport, protocol, None, loop)
+    
+    async def readline(self) -> str:
+        """The next line, or "" at end of input"""
+        if self.reader is not None:
+            return (await self.reader.readline()).decode()
+        return await asyncio.get_running_loop().run_in_executor(None, sys.stdin.readline)
+    
+    async def send(self, message: Dict[str, Any]) -> None:
+        # One write per message keeps concurrent responses from interleaving
+        data = json.dumps(message) + "\n"
+        if self.writer is not None:
+            self.writer.write(data.encode())
+            await self.writer.drain()
+        else:
+            sys.stdout.write(data)
+            sys.stdout.flush()
+
+class ExecutionLimiter:
+    """Caps how many executions each client runs at once
+    
+    Calls over the limit wait their turn; once a client also has
+    max_queued calls waiting, further calls are refused.
+    """
+    
+    def __init__(self, limit: int = CLIENT_MAX_EXECUTIONS, max_queued: int = CLIENT_MAX_QUEUED):
+        self.limit = limit
+        self.max_queued = max_queued
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.pending: Dict[str, int] = {}
+    
+    @asynccontextmanager
+    async def slot(self, client: str):
+        pending = self.pending.get(client, 0)
+        if pending >= self.limit + self.max_queued:
+            raise RuntimeError(f"Client '{client}' already has {pending} executions running or queued")
+        
+        self.pending[client] = pending + 1
+        semaphore = self.semaphores.setdefault(client, asyncio.Semaphore(self.limit))
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self.pending[client] -= 1
+            if not self.pending[client]:
+                del self.pending[client]
+                del self.semaphores[client]
+    
+    def describe(self) -> str:
+        running = {client: min(count, self.limit) for client, count in self.pending.items()}
+        text = f"## Executions\n\n- Limit: {self.limit} running and {self.max_queued} queued per client\n"
+        for client, count in self.pending.items():
+            text += f"- {client}: {running[client]} running, {count - running[client]} queued\n"
+        return text
 
 class JupyterMCPServer:
     def __init__(self):
         self.name = "jupyter-notebook-mcp"
         self.version = "1.0.0"
         self.notebooks = {}
+        self.kernels = KernelManager()
+        self.limiter = ExecutionLimiter()
+        self.client_name = "stdio"
+        self.requests: Dict[Any, asyncio.Task] = {}
         
-    async def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Handle incoming MCP requests"""
+    async def handle_request(self, request: Dict[str, Any], report: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Handle incoming MCP requests; report, if given, receives cell output as it streams"""
         try:
             method = request.get("method")
             params = request.get("params", {})
             
-            if method == "tools/list":
+            if method == "initialize":
+                return self.initialize(params)
+            elif method == "notifications/cancelled":
+                return self.cancel(params)
+            elif method == "ping" or (method or "").startswith("notifications/"):
+                return {}
+            elif method == "tools/list":
                 return await self.list_tools()
             elif method == "tools/call":
-                return await self.call_tool(params)
+                return await self.call_tool(params, report)
             else:
-                return {"error": f"Unknown method: {method}"}
+                return {"error": f"Unknown method: {method}", "code": METHOD_NOT_FOUND}
                 
         except Exception as e:
             return {"error": str(e)}
     
+    def submit(self, request: Dict[str, Any], transport: StdioTransport) -> asyncio.Task:
+        """Start handling a request, tracked by its id so it can be cancelled"""
+        task = asyncio.create_task(self.dispatch(request, transport))
+        request_id = request.get("id")
+        if request_id is not None and not (request.get("method") or "").startswith("notifications/"):
+            self.requests[request_id] = task
+            task.add_done_callback(lambda _: self.requests.get(request_id) is task and self.requests.pop(request_id))
+        return task
+    
+    def cancel(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Cancel the in-flight request params.requestId; its cell is interrupted and it gets no response"""
+        task = self.requests.get(params.get("requestId"))
+        if task is None or task.done():
+            return {"cancelled": False}
+        task.cancel()
+        return {"cancelled": True}
+
+    async def dispatch(self, request: Dict[str, Any], transport: StdioTransport) -> None:
+        """Handle one request and write its response whenever it completes
+        
+        Requests carrying an id get JSON-RPC 2.0 responses, JSON-RPC
+        notifications get none, and bare {"method", "params"} requests
+        still get the plain result object.
+        """
+        try:
+            response = await self.handle_request(request, self.progress_reporter(request, transport))
+        except asyncio.CancelledError:
+            # The client asked for this; per MCP a cancelled request gets no response
+            return
+        request_id = request.get("id")
+        
+        if request_id is None:
+            if "jsonrpc" in request:
+                return
+            message = response
+        elif "error" not in response:
+            message = {"jsonrpc": "2.0", "id": request_id, "result": response}
+        elif request.get("method") == "tools/call" and "code" not in response:
+            # Tool failures are results the model can read, not protocol errors
+            message = {"jsonrpc": "2.0", "id": request_id, "result": {"content": [{"type": "text", "text": response["error"]}], "isError": True}}
+        else:
+            message = {"jsonrpc": "2.0", "id": request_id, "error": {"code": response.get("code", SERVER_ERROR), "message": response["error"]}}
+        
+        try:
+            await transport.send(message)
+        except (BrokenPipeError, ConnectionResetError) as e:
+            print(f"Could not send response: {e}", file=sys.stderr)
+    
+    def progress_reporter(self, request: Dict[str, Any], transport: StdioTransport) -> Optional[OutputCallback]:
+        """Forward cell output as MCP progress notifications when the request has a progressToken"""
+        token = ((request.get("params") or {}).get("_meta") or {}).get("progressToken")
+        if token is None:
+            return None
+        sent = 0
+        
+        async def report(name: str, text: str) -> None:
+            nonlocal sent
+            sent += len(text)
+            try:
+                await transport.send({
+                    "jsonrpc": "2.0",
+                    "method": "notifications/progress",
+                    "params": {"progressToken": token, "progress": sent, "message": text, "stream": name}
+                })
+            except (BrokenPipeError, ConnectionResetError) as e:
+                print(f"Could not send progress: {e}", file=sys.stderr)
+        
+        return report
+
+    def initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """MCP handshake; remembers the client's name for execution limits"""
+        self.client_name = (params.get("clientInfo") or {}).get("name") or self.client_name
+        return {
+            "protocolVersion": params.get("protocolVersion", "2024-11-05"),
+            "capabilities": {"tools": {}},
+            "serverInfo": {"name": self.name, "version": self.version}
+        }
+    
     async def list_tools(self) -> Dict[str, Any]:
         """List available tools"""
         return {
@@ -54,11 +1000,23 @@ class JupyterMCPServer:
                         "type": "object",
                         "properties": {
                             "code": {"type": "string", "description": "Python code to execute"},
-                            "notebook_id": {"type": "string", "description": "Notebook ID (optional)"}
+                            "notebook_id": {"type": "string", "description": "Notebook ID (optional)"},
+                            "timeout": {"type": "number", "description": f"Seconds the cell may run before it is interrupted (default {CELL_TIMEOUT:g})"}
                         },
                         "required": ["code"]
                     }
                 },
+                {
+                    "name": "restart_kernel",
+                    "description": "Restart a notebook's kernel, clearing its variables",
+                    "inputSchema": {
+                        "type": "object",
+                        "properties": {
+                            "notebook_id": {"type": "string", "description": "Notebook ID"}
+                        },
+                        "required": ["notebook_id"]
+                    }
+                },
                 {
                     "name": "list_notebooks",
                     "description": "List all created notebooks",
@@ -85,7 +1043,8 @@ class JupyterMCPServer:
                     "inputSchema": {
                         "type": "object",
                         "properties": {
-                            "package": {"type": "string", "description": "Package name to install"}
+                            "package": {"type": "string", "description": "Package name to install"},
+                            "timeout": {"type": "number", "description": f"Seconds before the install is abandoned (default {INSTALL_TIMEOUT:g})"}
                         },
                         "required": ["package"]
                     }
@@ -98,7 +1057,8 @@ class JupyterMCPServer:
                         "properties": {
                             "data": {"type": "string", "description": "Data or data generation code"},
                             "chart_type": {"type": "string", "enum": ["line", "bar", "scatter", "histogram", "heatmap"], "description": "Chart type"},
-                            "title": {"type": "string", "description": "Chart title"}
+                            "title": {"type": "string", "description": "Chart title"},
+                            "timeout": {"type": "number", "description": f"Seconds the plotting code may run (default {CELL_TIMEOUT:g})"}
                         },
                         "required": ["data", "chart_type"]
                     }
@@ -106,16 +1066,29 @@ class JupyterMCPServer:
             ]
         }
     
-    async def call_tool(self, params: Dict[str, Any]) -> Dict[str, Any]:
+    async def call_tool(self, params: Dict[str, Any], report: Optional[OutputCallback] = None) -> Dict[str, Any]:
         """Call a specific tool"""
         tool_name = params.get("name")
         arguments = params.get("arguments", {})
         
+        if tool_name in EXECUTION_TOOLS:
+            # A gateway multiplexing several clients onto this server can tag each call
+            client = (params.get("_meta") or {}).get("clientId") or self.client_name
+            try:
+                async with self.limiter.slot(str(client)):
+                    return await self.run_tool(tool_name, arguments, report)
+            except Exception as e:
+                return {"error": str(e)}
+        return await self.run_tool(tool_name, arguments, report)
+    
+    async def run_tool(self, tool_name: str, arguments: Dict[str, Any], report: Optional[OutputCallback] = None) -> Dict[str, Any]:
         try:
             if tool_name == "create_notebook":
                 return await self.create_notebook(arguments)
             elif tool_name == "execute_cell":
-                return await self.execute_cell(arguments)
+                return await self.execute_cell(arguments, report)
+            elif tool_name == "restart_kernel":
+                return await self.restart_kernel(arguments)
             elif tool_name == "list_notebooks":
                 return await self.list_notebooks()
             elif tool_name == "export_notebook":
@@ -123,7 +1096,7 @@ class JupyterMCPServer:
             elif tool_name == "install_package":
                 return await self.install_package(arguments)
             elif tool_name == "create_visualization":
-                return await self.create_visualization(arguments)
+                return await self.create_visualization(arguments, report)
             else:
                 return {"error": f"Unknown tool: {tool_name}"}
                 
@@ -174,35 +1147,36 @@ class JupyterMCPServer:
         except Exception as e:
             return {"error": f"Failed to create notebook: {str(e)}"}
     
-    async def execute_cell(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute Python code in a cell"""
+    async def execute_cell(self, args: Dict[str, Any], report: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Execute Python code in the notebook's kernel, streaming its output to report"""
         code = args["code"]
         notebook_id = args.get("notebook_id")
         
+        label = f"cell-{uuid.uuid4().hex[:12]}"
+        owner = notebook_id if notebook_id in self.notebooks else None
+        streams = {name: OutputBuffer(name, label, self.kernels.spills, owner) for name in ("stdout", "stderr")}
+        
+        async def on_output(name: str, text: str) -> None:
+            streams[name].append(text)
+            if report is not None:
+                await report(name, text)
+        
         try:
-            # Create temporary Python file
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
-                temp_file.write(code)
-                temp_file_path = temp_file.name
-            
-            # Execute the code
-            result = subprocess.run(
-                [sys.executable, temp_file_path],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            # Clean up
-            os.unlink(temp_file_path)
+            timeout = deadline(args, CELL_TIMEOUT)
+            if notebook_id in self.notebooks:
+                result = await self.kernels.execute(notebook_id, code, timeout, on_output)
+            else:
+                # Cells outside a notebook get a warm pooled kernel each, thrown away afterwards
+                result = await self.kernels.execute_scratch(code, timeout, on_output)
             
             output = ""
-            if result.stdout:
-                output += f"Output:\n{result.stdout}\n"
-            if result.stderr:
-                output += f"Errors:\n{result.stderr}\n"
-            if result.returncode != 0:
-                output += f"Exit code: {result.returncode}\n"
+            if streams["stdout"].total:
+                output += f"Output:\n{streams['stdout'].render()}\n"
+            if streams["stderr"].total or result["error"]:
+                output += f"Errors:\n{streams['stderr'].render()}{result['error'] or ''}\n"
+            if result.get("timed_out"):
+                kept = "the kernel kept its state" if notebook_id in self.notebooks else "the scratch kernel was discarded"
+                output += f"Interrupted after the {timeout:g}s limit; {kept}\n"
             
             if not output:
                 output = "Code executed successfully (no output)"
@@ -219,16 +1193,37 @@ class JupyterMCPServer:
                 "content": [{"type": "text", "text": f"# Code Execution Result\n\n```python\n{code}\n```\n\n{output}"}]
             }
             
-        except subprocess.TimeoutExpired:
-            return {"error": "Code execution timed out (30s limit)"}
+        except asyncio.TimeoutError:
+            error = f"Code execution timed out ({timeout:g}s limit) and did not stop on interrupt; the kernel was restarted"
+            if streams["stdout"].total:
+                error += f"\n\nOutput before the timeout:\n{streams['stdout'].render()}"
+            return {"error": error}
         except Exception as e:
             return {"error": f"Execution failed: {str(e)}"}
+        finally:
+            for stream in streams.values():
+                stream.close()
+    
+    async def restart_kernel(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Restart a notebook's kernel"""
+        notebook_id = args["notebook_id"]
+        
+        if notebook_id not in self.notebooks:
+            return {"error": f"Notebook {notebook_id} not found"}
+        
+        try:
+            kernel = await self.kernels.restart(notebook_id)
+            return {
+                "content": [{"type": "text", "text": f"Kernel restarted for '{self.notebooks[notebook_id]['name']}' (ready in {kernel.ready_ms:.0f} ms)"}]
+            }
+        except Exception as e:
+            return {"error": f"Kernel restart failed: {str(e)}"}
     
     async def list_notebooks(self) -> Dict[str, Any]:
         """List all created notebooks"""
         if not self.notebooks:
             return {
-                "content": [{"type": "text", "text": "No notebooks created yet. Use create_notebook to start."}]
+                "content": [{"type": "text", "text": f"No notebooks created yet. Use create_notebook to start.\n\n{self.kernels.describe()}\n{self.limiter.describe()}"}]
             }
         
         notebook_list = "# Jupyter Notebooks\n\n"
@@ -236,7 +1231,12 @@ class JupyterMCPServer:
             notebook_list += f"**{notebook['name']}**\n"
             notebook_list += f"- ID: {notebook_id}\n"
             notebook_list += f"- Path: {notebook['path']}\n"
-            notebook_list += f"- Cells: {len(notebook['cells'])}\n\n"
+            notebook_list += f"- Cells: {len(notebook['cells'])}\n"
+            kernel = self.kernels.kernels.get(notebook_id)
+            notebook_list += f"- Kernel: {kernel.describe() if kernel else 'not started'}\n\n"
+        
+        notebook_list += self.kernels.describe()
+        notebook_list += "\n" + self.limiter.describe()
         
         return {
             "content": [{"type": "text", "text": notebook_list}]
@@ -312,26 +1312,33 @@ class JupyterMCPServer:
         package = args["package"]
         
         try:
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "install", package],
-                capture_output=True,
-                text=True,
-                timeout=60
+            timeout = deadline(args, INSTALL_TIMEOUT)
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "pip", "install", package,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
             )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                process.kill()
+                await process.wait()
+                raise
             
-            if result.returncode == 0:
+            if process.returncode == 0:
                 return {
-                    "content": [{"type": "text", "text": f"Package '{package}' installed successfully!\n\nOutput:\n{result.stdout}"}]
+                    "content": [{"type": "text", "text": f"Package '{package}' installed successfully!\n\nOutput:\n{stdout.decode(errors='replace')}"}]
                 }
             else:
-                return {"error": f"Failed to install {package}: {result.stderr}"}
+                return {"error": f"Failed to install {package}: {stderr.decode(errors='replace')}"}
                 
-        except subprocess.TimeoutExpired:
-            return {"error": "Package installation timed out"}
+        except asyncio.TimeoutError:
+            return {"error": f"Package installation timed out ({timeout:g}s limit)"}
         except Exception as e:
             return {"error": f"Installation failed: {str(e)}"}
     
-    async def create_visualization(self, args: Dict[str, Any]) -> Dict[str, Any]:
+    async def create_visualization(self, args: Dict[str, Any], report: Optional[OutputCallback] = None) -> Dict[str, Any]:
         """Create data visualization"""
         data = args["data"]
         chart_type = args["chart_type"]
@@ -416,37 +1423,51 @@ else:
         viz_code += """
 plt.tight_layout()
 plt.savefig('/tmp/visualization.png', dpi=300, bbox_inches='tight')
-plt.show()
+plt.close('all')
 print("Visualization saved to /tmp/visualization.png")
 """
         
         # Execute the visualization code
-        return await self.execute_cell({"code": viz_code})
+        return await self.execute_cell({"code": viz_code, "timeout": args.get("timeout", CELL_TIMEOUT)}, report)
 
 async def main():
     """Main server loop"""
     server = JupyterMCPServer()
+    transport = StdioTransport()
+    await transport.open()
+    # Preload the zygote and fork the idle pool while waiting for the first request
+    warmup = asyncio.create_task(server.kernels.start())
+    in_flight = set()
     
-    # Simple stdio-based MCP protocol implementation
+    # Each request runs as its own task, so a long cell never holds up the others
     while True:
+        line = await transport.readline()
+        if not line.strip():
+            break
+        
         try:
-            line = input()
-            if not line:
-                break
-                
             request = json.loads(line)
-            response = await server.handle_request(request)
-            print(json.dumps(response))
-            sys.stdout.flush()
-            
-        except EOFError:
-            break
         except json.JSONDecodeError:
-            print(json.dumps({"error": "Invalid JSON"}))
-            sys.stdout.flush()
-        except Exception as e:
-            print(json.dumps({"error": str(e)}))
-            sys.stdout.flush()
+            await transport.send({"jsonrpc": "2.0", "id": None, "error": {"code": PARSE_ERROR, "message": "Invalid JSON"}})
+            continue
+        if not isinstance(request, dict):
+            await transport.send({"jsonrpc": "2.0", "id": None, "error": {"code": INVALID_REQUEST, "message": "Request must be an object"}})
+            continue
+        
+        task = server.submit(request, transport)
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    
+    # Input is closed, but the client may still be reading responses
+    if in_flight:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    warmup.cancel()
+    await server.kernels.shutdown_all()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if "--kernel" in sys.argv:
+        run_kernel()
+    elif "--zygote" in sys.argv:
+        run_zygote(sys.argv[sys.argv.index("--zygote") + 1])
+    else:
+        asyncio.run(main())
\ No newline at end of file